@@ -0,0 +1,53 @@
+"""
+decode benchmarks
+
+compares how fast each video reader can pull polled frames out of a video, without running any analysis.
+"opencv-read" is the old pass1 loop that decoded and converted every frame.
+
+usage: python -m matchinator.bench <video> [poll] [max_sec]
+"""
+import sys
+import time
+from . import video
+
+# name: (backend, reader options)
+READERS = {
+    "opencv-read": ("opencv", {"read_mode": "read"}),
+    "opencv-grab": ("opencv", {"read_mode": "grab"}),
+    "opencv-seek": ("opencv", {"read_mode": "seek"}),
+    "pyav": ("pyav", {}),
+    "ffmpeg": ("ffmpeg", {}),
+    "ffmpeg-720p": ("ffmpeg", {"scale": (1280, 720)}),
+}
+
+
+def bench_readers(video_path, poll=1, max_sec=600, readers=None, pout=sys.stdout):
+    """Times reader.poll over the first max_sec seconds of video for each reader in READERS.
+    returns {name: (polled frames, wall seconds)}
+    """
+    readers = readers or list(READERS)
+    results = {}
+    for name in readers:
+        backend, opts = READERS[name]
+        with video.open_reader(video_path, backend, **opts) as reader:
+            end_sec = min(max_sec, reader.duration)
+
+            start = time.time()
+            nframes = 0
+            for _ in reader.poll(poll, 0, end_sec):
+                nframes += 1
+            elapsed = time.time() - start
+
+        results[name] = (nframes, elapsed)
+        print(f"{name:>12}: {nframes} polled frames in {elapsed:.3f}s "
+              f"({end_sec / elapsed:.2f}x realtime)", file=pout)
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__.strip(), file=sys.stderr)
+        sys.exit(1)
+    bench_readers(sys.argv[1],
+                  poll=float(sys.argv[2]) if len(sys.argv) > 2 else 1,
+                  max_sec=float(sys.argv[3]) if len(sys.argv) > 3 else 600)
@@ -0,0 +1,259 @@
+"""
+columnar pass1 results
+
+Pass1EventData keeps a list of Pass1EventMatch dataclasses, which for multi-day, multi-field streams is a lot of
+small python objects to hold, pickle and convert to pandas. Pass1Columns holds the same data as one numpy
+structured array: match names and team tuples are interned into tables and stored as int32 ids, the booleans
+(and whether is_replay is known at all) are packed into one flags byte. it saves to a directory (rows.npy + meta.json) that loads memory-mapped, so opening and
+filtering a season's worth of pass1 output doesn't parse anything per row.
+
+it still iterates as Pass1EventMatch objects (and has .matches), so pass2.combine_matches and other code written
+against Pass1EventData take it as is.
+"""
+import os
+import json
+import numpy as np
+from . import pass1
+
+# bits of the flags column
+TOP = 1
+TELE = 2
+REPLAY = 4
+FLIPPED = 8
+# pass1 leaves is_replay None (not checked), which is kept apart from False
+REPLAY_KNOWN = 16
+
+ROW_DTYPE = np.dtype([
+    ("frame_idx", np.int32),
+    ("video_sec", np.float64),
+    ("name_id", np.int32),
+    ("red_id", np.int32),
+    ("blue_id", np.int32),
+    # any integer OCR read, misreads included (see MATCH_TS_RANGE)
+    ("match_ts", np.int64),
+    ("display_id", np.int8),
+    ("flags", np.uint8),
+])
+
+
+# pass1 keeps any timer read that parses as an int. reads too long for int64 are clamped into it, symmetrically so
+# negating a column never overflows
+MATCH_TS_RANGE = (-np.iinfo(np.int64).max, np.iinfo(np.int64).max)
+
+
+class Interner:
+    """maps values to small int ids. table[id] is the value"""
+    def __init__(self, table=()):
+        self.table = list(table)
+        self.ids = {v: i for i, v in enumerate(self.table)}
+
+    def get(self, value):
+        i = self.ids.get(value)
+        if i is None:
+            i = self.ids[value] = len(self.table)
+            self.table.append(value)
+        return i
+
+    def __len__(self):
+        return len(self.table)
+
+
+class Pass1Columns:
+    """pass1 results as columns. see the module docstring.
+
+    rows: ROW_DTYPE structured array (may be a read-only memmap)
+    names: match name table, indexed by rows["name_id"]
+    teams: team tuple table, indexed by rows["red_id"] and rows["blue_id"]
+
+    indexing with an int gives a Pass1EventMatch, with a slice, boolean mask or index array a Pass1Columns sharing
+    the tables. column arrays are available as attributes (frame_idx, video_sec, top, is_tele, ...)
+    """
+    def __init__(self, fps, width, height, rows=None, names=(), teams=()):
+        self.fps = fps
+        self.width = width
+        self.height = height
+        self.rows = rows if rows is not None else np.empty(0, ROW_DTYPE)
+        self.names = list(names)
+        self.teams = [tuple(t) for t in teams]
+
+    @classmethod
+    def from_matches(cls, fps, width, height, matches):
+        """builds columns from an iterable of Pass1EventMatch (e.g. pass1.iter_run)"""
+        matches = list(matches)
+        # dicts of value -> id, setdefault interns without a python method call per row
+        names, teams = {}, {}
+        rows = np.empty(len(matches), ROW_DTYPE)
+        # column at a time, a list comprehension per field is a lot faster than building row tuples
+        rows["frame_idx"] = [m.frame_idx for m in matches]
+        rows["video_sec"] = [m.video_sec for m in matches]
+        rows["name_id"] = [names.setdefault(m.name, len(names)) for m in matches]
+        rows["red_id"] = [teams.setdefault(tuple(m.red_teams), len(teams)) for m in matches]
+        rows["blue_id"] = [teams.setdefault(tuple(m.blue_teams), len(teams)) for m in matches]
+        lo, hi = MATCH_TS_RANGE
+        match_ts = [m.match_ts for m in matches]
+        try:
+            rows["match_ts"] = match_ts
+        except OverflowError:
+            rows["match_ts"] = [min(max(ts, lo), hi) for ts in match_ts]
+        np.maximum(rows["match_ts"], lo, out=rows["match_ts"])
+        rows["display_id"] = [m.display_id for m in matches]
+        rows["flags"] = [TOP * bool(m.top) | TELE * bool(m.is_tele) | REPLAY * bool(m.is_replay)
+                         | REPLAY_KNOWN * (m.is_replay is not None) | FLIPPED * bool(m.colors_flipped)
+                         for m in matches]
+        return cls(fps, width, height, rows, list(names), list(teams))
+
+    @classmethod
+    def from_event_data(cls, event_data: pass1.Pass1EventData):
+        return cls.from_matches(event_data.fps, event_data.width, event_data.height, event_data.matches)
+
+    def to_event_data(self):
+        return pass1.Pass1EventData(self.fps, self.width, self.height, list(self))
+
+    @staticmethod
+    def concat(parts):
+        """joins several Pass1Columns (e.g. every day of an event) into one, re-interning their tables"""
+        parts = list(parts)
+        if not parts:
+            raise ValueError("nothing to concat")
+        names, teams = Interner(), Interner()
+        out = []
+        for part in parts:
+            # old id -> new id lookup arrays for this part's tables
+            name_map = np.array([names.get(n) for n in part.names] or [0], np.int32)
+            team_map = np.array([teams.get(t) for t in part.teams] or [0], np.int32)
+            # older saves may have a narrower match_ts
+            rows = part.rows.astype(ROW_DTYPE)
+            rows["name_id"] = name_map[rows["name_id"]]
+            rows["red_id"] = team_map[rows["red_id"]]
+            rows["blue_id"] = team_map[rows["blue_id"]]
+            out.append(rows)
+        first = parts[0]
+        return Pass1Columns(first.fps, first.width, first.height, np.concatenate(out), names.table, teams.table)
+
+    # files
+
+    def save(self, path):
+        """writes path/rows.npy and path/meta.json"""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "rows.npy"), np.ascontiguousarray(self.rows))
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"fps": self.fps, "width": self.width, "height": self.height,
+                       "names": self.names, "teams": self.teams}, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """reads a saved Pass1Columns. with mmap the rows are memory-mapped read-only instead of read in"""
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        rows = np.load(os.path.join(path, "rows.npy"), mmap_mode="r" if mmap else None)
+        return cls(meta["fps"], meta["width"], meta["height"], rows, meta["names"], meta["teams"])
+
+    # columns
+
+    def __getattr__(self, attr):
+        # only called for attributes not found normally, i.e. the plain row fields
+        if attr in ROW_DTYPE.names:
+            return self.rows[attr]
+        raise AttributeError(attr)
+
+    def _flag(self, bit):
+        return (self.rows["flags"] & bit) != 0
+
+    @property
+    def top(self):
+        return self._flag(TOP)
+
+    @property
+    def is_tele(self):
+        return self._flag(TELE)
+
+    @property
+    def is_replay(self):
+        """True where a replay was seen. see replay_known"""
+        return self._flag(REPLAY)
+
+    @property
+    def replay_known(self):
+        """False where is_replay was None"""
+        return self._flag(REPLAY_KNOWN)
+
+    @staticmethod
+    def _replay(flags):
+        return bool(flags & REPLAY) if flags & REPLAY_KNOWN else None
+
+    @property
+    def colors_flipped(self):
+        return self._flag(FLIPPED)
+
+    def find_name(self, name):
+        """id of name in the names table, or -1 if it never shows up"""
+        try:
+            return self.names.index(name)
+        except ValueError:
+            return -1
+
+    # rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _row(self, row):
+        flags = int(row["flags"])
+        return pass1.Pass1EventMatch(
+            self.names[row["name_id"]], bool(flags & TOP), int(row["frame_idx"]), float(row["video_sec"]),
+            bool(flags & TELE), int(row["match_ts"]), self.teams[row["red_id"]], self.teams[row["blue_id"]],
+            self._replay(flags), bool(flags & FLIPPED), int(row["display_id"]))
+
+    def __iter__(self):
+        # one tolist() is much faster than indexing the structured array per row
+        for frame_idx, video_sec, name_id, red_id, blue_id, match_ts, display_id, flags in self.rows.tolist():
+            yield pass1.Pass1EventMatch(
+                self.names[name_id], bool(flags & TOP), frame_idx, video_sec, bool(flags & TELE), match_ts,
+                self.teams[red_id], self.teams[blue_id], self._replay(flags), bool(flags & FLIPPED), display_id)
+
+    @property
+    def matches(self):
+        """Pass1EventData compatibility, iterates the rows"""
+        return self
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return self._row(self.rows[index])
+        return Pass1Columns(self.fps, self.width, self.height, self.rows[index], self.names, self.teams)
+
+    def select(self, mask):
+        return self[mask]
+
+    def named(self, name):
+        """the rows read as match name"""
+        return self[self.rows["name_id"] == self.find_name(name)]
+
+    def between(self, start_sec, end_sec):
+        """the rows with start_sec <= video_sec < end_sec"""
+        secs = self.rows["video_sec"]
+        if len(secs) and np.all(secs[1:] >= secs[:-1]):
+            return self[np.searchsorted(secs, start_sec):np.searchsorted(secs, end_sec)]
+        return self[(secs >= start_sec) & (secs < end_sec)]
+
+    def to_pandas(self):
+        """a DataFrame with the Pass1EventMatch columns. names and teams are categoricals over the tables,
+        so no per-row strings or tuples get built"""
+        import pandas as pd
+
+        def categorical(codes, table):
+            return pd.Categorical.from_codes(codes, categories=pd.Index(table, dtype=object, tupleize_cols=False))
+
+        rows = self.rows
+        return pd.DataFrame({
+            "name": categorical(rows["name_id"], self.names),
+            "top": self.top,
+            "frame_idx": rows["frame_idx"],
+            "video_sec": rows["video_sec"],
+            "is_tele": self.is_tele,
+            "match_ts": rows["match_ts"],
+            "red_teams": categorical(rows["red_id"], self.teams),
+            "blue_teams": categorical(rows["blue_id"], self.teams),
+            "is_replay": pd.arrays.BooleanArray(self.is_replay, ~self.replay_known),
+            "colors_flipped": self.colors_flipped,
+            "display_id": rows["display_id"],
+        }, copy=False)
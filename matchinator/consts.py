@@ -8,18 +8,87 @@ PP_CAP_THR = 0.6
 # match preview red/blue threshold
 MATCH_PREVIEW_THR = 0.7
 
+# matchers.BlobMatcher color classes. off by default, the preview/flip checks count colors like the original
+# inRange thresholds, which MATCH_PREVIEW_THR was tuned against. with HUE_WRAP, hue distance wraps around at 180
+# so red (179) also takes in hues 0-4. achromatic pixels (black, white, gray) all have hue 0, so then pixels under
+# HUE_MIN_SAT saturation or HUE_MIN_VAL value don't count as any color. untested on real footage
+HUE_WRAP = False
+HUE_MIN_SAT = 64
+HUE_MIN_VAL = 48
+
+# every n-th row and column is sampled when measuring how much of the match display is a color. 1 counts every
+# pixel, like the original checks
+COLOR_SAMPLE_STEP = 1
+
+# a name/team crop only counts as changed (and gets read again) if a pixel of its 1/4 scale grayscale
+# moved by more than this
+ROI_CHANGE_THR = 32
+
 # match window threshold
 MATCH_TOTAL_SCORE_THR = 0.6
 
 # for match entry grouping in pass2
 MATCH_GROUP_MIN_COUNT = 5
 
+# online pass2: seconds of video without entries from a display before its open match is emitted early
+# (it's revised if the same match shows up again)
+PASS2_CLOSE_SEC = 30
+
 # number of seconds to clip a match before auto
 MATCH_PRE_AUTO_START = 3
 
 # 
 MATCH_POST_TELE_END = 5
 
+# pass1 browse mode: seconds between polls when no match display is on screen
+BROWSE_POLL = 8
+
+# pass1 browse mode: seconds without a match display before dropping back to browsing
+BROWSE_LINGER = 20
+
+# match period lengths in seconds: auto, the auto/teleop switchover countdown, teleop
+MATCH_AUTO_SEC = 30
+MATCH_SWITCHOVER_SEC = 8
+MATCH_TELE_SEC = 120
+
+# pass1 skip-ahead: consistent timer readings needed before skipping through a match
+SKIP_LOCK_READINGS = 3
+
+# pass1 skip-ahead: seconds between the sparse samples checking a skipped match still runs on time
+SKIP_VERIFY_POLL = 20
+
+# pass1 skip-ahead: dense polling resumes this many seconds before the predicted end of teleop
+SKIP_TELE_END_LEAD = 10
+
+# pass1 skip-ahead: how far (seconds) a reading may be off the predicted match clock
+SKIP_TOLERANCE = 2
+
+# lowest digits.DigitRecognizer confidence (worst glyph correlation) accepted before falling back to OCR
+DIGIT_MIN_CONFIDENCE = 0.7
+
+# shortest time a match display stays up (the auto period). browse polling never goes slower than this
+MATCH_MIN_DISPLAY_SEC = 30
+
+# keyframe index: seconds of padding added around each span that may have a match display
+INDEX_PAD = 5
+
+# logo tracking: pixels (at the 1280x720 compare size) searched around the last known logo position
+LOGO_TRACK_MARGIN = 24
+
+# logo tracking: tracked matches between full frame searches
+LOGO_TRACK_REVALIDATE = 60
+
+# most match displays looked for in one frame (multi-field streams)
+MAX_DISPLAYS = 4
+
+# template matching pyramid: downscale factor of the coarse pass (1 disables it)
+TEMPLATE_PYRAMID_FACTOR = 4
+
+# template matching pyramid: coarse peaks refined at full resolution, and how far below the match threshold
+# a coarse peak may score and still be refined
+TEMPLATE_PYRAMID_TOP_K = 3
+TEMPLATE_PYRAMID_TOL = 0.3
+
 class ScaledParams:
     """Returns an object that scales constants appropriately."""
     def __init__(self, in_width, in_height):
@@ -0,0 +1,133 @@
+"""
+tesseract-free digit recognizer
+
+the match timer and team numbers are drawn in one fixed overlay font per season, so instead of running general
+purpose OCR on them we segment the glyphs with column projections and score each one against a set of glyph
+templates learned from a handful of labeled crops.
+"""
+import numpy as np
+import cv2
+
+
+class DigitRecognizer:
+    """glyph template classifier.
+
+    templates: {char: flattened normalized glyph}, usually from train() or load()
+    glyph_size: (w, h) every glyph is resized to before comparing
+    min_ink: glyphs with fewer foreground pixels than this are treated as noise
+    """
+    def __init__(self, templates=None, glyph_size=(16, 24), min_ink=4):
+        self.glyph_size = tuple(glyph_size)
+        self.min_ink = min_ink
+        self.set_templates(templates or {})
+
+    def set_templates(self, templates):
+        self.chars = list(templates)
+        if templates:
+            self.templates = np.stack([templates[c] for c in self.chars]).astype(np.float32)
+        else:
+            self.templates = np.zeros((0, self.glyph_size[0] * self.glyph_size[1]), dtype=np.float32)
+
+    @staticmethod
+    def binarize(img):
+        """otsu thresholds img so the text is 1 and the background 0, whichever way around the overlay draws it"""
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        _, thr = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        # text covers less of the crop than the background does
+        if np.count_nonzero(thr) > thr.size / 2:
+            thr = 1 - thr
+        return thr
+
+    @staticmethod
+    def _runs(profile):
+        """(start, end) of every run of nonzero values in a 1d projection"""
+        nz = np.concatenate(([0], (profile > 0).astype(np.int8), [0]))
+        edges = np.flatnonzero(np.diff(nz))
+        return list(zip(edges[::2], edges[1::2]))
+
+    def segment(self, img):
+        """splits img into text lines by row projection, then glyphs by column projection.
+        returns a list of lines, each a list of binarized glyph images cropped to their ink
+        """
+        thr = self.binarize(img)
+        lines = []
+        for r0, r1 in self._runs(thr.sum(axis=1)):
+            band = thr[r0:r1]
+            glyphs = []
+            for c0, c1 in self._runs(band.sum(axis=0)):
+                glyph = band[:, c0:c1]
+                if glyph.sum() < self.min_ink:
+                    continue
+                rows = np.flatnonzero(glyph.sum(axis=1))
+                glyphs.append(glyph[rows[0]:rows[-1] + 1])
+            if glyphs:
+                lines.append(glyphs)
+        return lines
+
+    def normalize(self, glyphs):
+        """resizes glyphs to glyph_size and flattens them into zero mean, unit norm rows"""
+        if not glyphs:
+            return np.zeros((0, self.glyph_size[0] * self.glyph_size[1]), dtype=np.float32)
+        vecs = np.stack([cv2.resize(g.astype(np.float32), self.glyph_size, interpolation=cv2.INTER_AREA).ravel()
+                         for g in glyphs])
+        vecs -= vecs.mean(axis=1, keepdims=True)
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        return vecs / np.where(norms > 0, norms, 1)
+
+    def classify(self, glyphs):
+        """scores every glyph against every template at once. returns (chars, scores), scores in [-1, 1]"""
+        if not len(self.chars):
+            raise RuntimeError("digit recognizer has no templates, train() or load() it first")
+        scores = self.normalize(glyphs) @ self.templates.T
+        best = scores.argmax(axis=1)
+        return [self.chars[i] for i in best], scores[np.arange(len(best)), best]
+
+    def read(self, img):
+        """returns (text, confidence). lines are joined by newlines, confidence is the worst glyph score"""
+        lines = self.segment(img)
+        flat = [g for line in lines for g in line]
+        if not flat:
+            return "", 0.0
+        chars, scores = self.classify(flat)
+
+        out = []
+        i = 0
+        for line in lines:
+            out.append("".join(chars[i:i + len(line)]))
+            i += len(line)
+        return "\n".join(out), float(scores.min())
+
+    def train(self, crops, labels):
+        """builds templates from labeled crops, e.g. timer crops labeled "117" or team crops labeled "16072\\n8492".
+        crops that don't segment into as many glyphs as their label has characters are skipped.
+        returns the number of crops used
+        """
+        samples = {}
+        used = 0
+        for crop, label in zip(crops, labels):
+            lines = self.segment(crop)
+            label_lines = [l.replace(" ", "") for l in label.split("\n") if l.strip()]
+            if [len(l) for l in lines] != [len(l) for l in label_lines]:
+                continue
+            used += 1
+            for glyphs, text in zip(lines, label_lines):
+                for vec, ch in zip(self.normalize(glyphs), text):
+                    samples.setdefault(ch, []).append(vec)
+
+        templates = {}
+        for ch, vecs in sorted(samples.items()):
+            mean = np.mean(vecs, axis=0)
+            templates[ch] = mean / (np.linalg.norm(mean) or 1)
+        self.set_templates(templates)
+        return used
+
+    def save(self, path):
+        np.savez(path, chars=np.array(self.chars), templates=self.templates,
+                 glyph_size=np.array(self.glyph_size), min_ink=self.min_ink)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        rec = cls(glyph_size=tuple(int(v) for v in data["glyph_size"]), min_ink=int(data["min_ink"]))
+        rec.set_templates(dict(zip((str(c) for c in data["chars"]), data["templates"])))
+        return rec
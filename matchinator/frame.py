@@ -0,0 +1,105 @@
+"""
+per-frame preprocessing cache
+
+one polled frame goes through the logo matcher, the preview check, the cap matcher and the color flip check,
+and each of them used to do its own grayscale/HSV conversion or resize of the same pixels. a FrameContext
+computes each of those once, on first use, and hands out the same result to everyone after that.
+"""
+import cv2
+
+
+class FrameContext:
+    """lazily computed, memoized versions of a BGR frame (or a crop of one).
+
+    slicing it like the image (ctx[y0:y1, x0:x1, :]) returns a memoized child context for that crop.
+    a child slices its gray/HSV out of its parent's when the parent already has them instead of converting again.
+    matchers.* and the util checks accept a FrameContext anywhere they take a BGR image.
+
+    stats (shared with all children): conversions actually computed vs. ones served from the cache.
+    pass a dict (or Counter) to accumulate them over many frames
+    """
+    def __init__(self, image, parent=None, offset=(0, 0), stats=None):
+        self.image = image
+        self.parent = parent
+        # (y, x) of this crop in the parent
+        self.offset = offset
+        if parent is not None:
+            self.stats = parent.stats
+        else:
+            self.stats = stats if stats is not None else {}
+            self.stats.setdefault("computed", 0)
+            self.stats.setdefault("saved", 0)
+        self._cache = {}
+        self._children = {}
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    @property
+    def ndim(self):
+        return self.image.ndim
+
+    def _get(self, key, compute):
+        val = self._peek(key)
+        if val is not None:
+            self.stats["saved"] += 1
+        else:
+            self.stats["computed"] += 1
+            val = compute()
+        self._cache[key] = val
+        return val
+
+    def _peek(self, key):
+        """key if this context or one of its ancestors (cropped) already has it, without computing anything"""
+        if key in self._cache:
+            return self._cache[key]
+        if self.parent is None:
+            return None
+        val = self.parent._peek(key)
+        if val is None:
+            return None
+        y, x = self.offset
+        h, w = self.image.shape[:2]
+        return val[y:y + h, x:x + w]
+
+    @property
+    def gray(self):
+        return self._get("gray", lambda: cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY))
+
+    @property
+    def hsv(self):
+        return self._get("hsv", lambda: cv2.cvtColor(self.image, cv2.COLOR_BGR2HSV))
+
+    def scaled_gray(self, size):
+        """gray resized to size (w, h), or gray itself if it's already that size"""
+        if size == (self.image.shape[1], self.image.shape[0]):
+            return self.gray
+        # resizes aren't croppable out of the parent, so they're only memoized per context
+        key = ("scaled_gray", size)
+        if key in self._cache:
+            self.stats["saved"] += 1
+            return self._cache[key]
+        self.stats["computed"] += 1
+        self._cache[key] = val = cv2.resize(self.gray, size)
+        return val
+
+    def __getitem__(self, index):
+        if not isinstance(index, tuple):
+            index = (index,)
+        h, w = self.image.shape[:2]
+        ys = index[0].indices(h) if len(index) > 0 else (0, h, 1)
+        xs = index[1].indices(w) if len(index) > 1 else (0, w, 1)
+        if ys[2] != 1 or xs[2] != 1 or any(i != slice(None) for i in index[2:]):
+            raise IndexError("FrameContext only supports plain row/column crops")
+
+        key = (ys[0], max(ys[1], ys[0]), xs[0], max(xs[1], xs[0]))
+        if key not in self._children:
+            y0, y1, x0, x1 = key
+            self._children[key] = FrameContext(self.image[y0:y1, x0:x1], parent=self, offset=(y0, x0))
+        return self._children[key]
+
+
+def image_of(img):
+    """the BGR array behind img, which may be a FrameContext"""
+    return img.image if isinstance(img, FrameContext) else img
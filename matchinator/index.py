@@ -0,0 +1,117 @@
+"""
+keyframe index
+
+a quick pre-pass over a long stream that only decodes keyframes (every 2-4s in most streams), runs the
+logo/preview checks on them and records the spans where a match display is probably up. pass1 can then run
+densely inside those spans only (pass1.run(index=...)), since matches are a minority of stream time.
+"""
+import sys
+import json
+import time
+from . import consts, util, video
+
+
+class DisplayIndex:
+    """sorted, non-overlapping (start, end) seconds where a match display may be on screen"""
+    def __init__(self, intervals, duration=None):
+        self.intervals = merge_intervals(intervals)
+        self.duration = duration
+
+    def __iter__(self):
+        return iter(self.intervals)
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def __repr__(self):
+        return f"DisplayIndex({self.intervals!r}, duration={self.duration!r})"
+
+    def total(self):
+        """seconds covered by the index"""
+        return sum(end - start for start, end in self.intervals)
+
+    def contains(self, sec):
+        return any(start <= sec < end for start, end in self.intervals)
+
+    def clip(self, start_sec=0, end_sec=None):
+        """the intervals cut down to [start_sec, end_sec)"""
+        out = []
+        for start, end in self.intervals:
+            start, end = max(start, start_sec), end if end_sec is None else min(end, end_sec)
+            if start < end:
+                out.append((start, end))
+        return out
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"duration": self.duration, "intervals": self.intervals}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls([tuple(i) for i in data["intervals"]], data.get("duration"))
+
+
+def merge_intervals(intervals):
+    """sorts (start, end) pairs and merges the ones that overlap or touch"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def intervals_from_samples(samples, duration, pad=consts.INDEX_PAD, max_gap=consts.MATCH_MIN_DISPLAY_SEC):
+    """turns (sec, display found) keyframe samples into padded intervals.
+
+    a display seen at a keyframe could have come up right after the previous keyframe and stay until the next
+    one, so each hit covers the whole span between its neighbors. gaps between keyframes longer than max_gap
+    could hide a whole match, so they're kept too.
+    """
+    # the ends of the video act as misses
+    samples = [(0, False)] + sorted(samples) + [(duration, False)]
+    intervals = []
+    for i in range(1, len(samples) - 1):
+        if samples[i][1]:
+            intervals.append((samples[i - 1][0], samples[i + 1][0]))
+    for (a, _), (b, _) in zip(samples, samples[1:]):
+        if b - a > max_gap:
+            intervals.append((a, b))
+    return [(max(start - pad, 0), min(end + pad, duration)) for start, end in intervals]
+
+
+def build_index(video_path, en_name=None, pad=consts.INDEX_PAD, max_gap=consts.MATCH_MIN_DISPLAY_SEC, pout=sys.stderr,
+                **reader_opts):
+    """Decodes only the keyframes of video_path and returns a DisplayIndex of where match displays may be.
+    en_name: logo template(s), like pass1.run
+    reader_opts: passed to video.PyAVReader
+    """
+    # imported here, pass1 imports this module
+    from . import pass1
+
+    with video.PyAVReader(video_path, **reader_opts) as reader:
+        params = consts.ScaledParams(reader.width, reader.height)
+        analyzer = pass1.FrameAnalyzer(params, en_name, track_logo=False, skip_unchanged=False)
+        duration = reader.duration
+
+        samples = []
+        start = time.time()
+        for vframe in reader.keyframes():
+            samples.append((vframe.sec, bool(analyzer.detect(vframe.image))))
+            print(f"index: {util.timef(vframe.sec * 1000)}        ", end="\r", file=pout)
+        duration = duration or (samples[-1][0] if samples else 0)
+
+    index = DisplayIndex(intervals_from_samples(samples, duration, pad=pad, max_gap=max_gap), duration)
+    print(f"\nindexed {len(samples)} keyframes in {time.time() - start:.2f}s, "
+          f"{index.total():.0f}s of {duration:.0f}s may have a match display", file=pout)
+    return index
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("usage: python -m matchinator.index <video> <index.json>", file=sys.stderr)
+        sys.exit(1)
+    build_index(sys.argv[1]).save(sys.argv[2])
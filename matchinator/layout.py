@@ -0,0 +1,235 @@
+"""
+roinator layouts
+
+roinator saves named regions of interest drawn over a reference image of the match display as
+{"img_w", "img_h", "roi": [{"name", "x", "y", "w", "h", "rtype", "visible"}, ...]}.
+this module turns such a layout into an ExtractionPlan: the slice of each region in a display band plus the
+routine that reads that region type, so a new season's overlay is a new layout file rather than new offsets in
+consts.ScaledParams. pass1 reads through one with run(layout=...), see FrameAnalyzer.
+
+a layout also needs to know where in its reference image the match display band is (the full width strip
+util.get_match_display cuts out below the logo) and where the logo's top left corner is. these are the optional
+"band": [x, y, w, h] and "logo": [x, y] keys of the file, or arguments to Layout. layouts drawn on roinator's own
+pp.png get them from PP_REFERENCE; any other reference image has to say, and a band that isn't shaped like a
+display band is rejected.
+
+regions are scaled from the reference band to the frame's (full frame width by ScaledParams.DISPLAY_HEIGHT),
+so one layout works at any resolution, to within a pixel of the ScaledParams offsets. a display above the logo is
+laid out upside down (crop_match_time measures the timer from the band's top edge instead of its bottom), so for
+those bands they're mirrored vertically. regions outside the band (the match name, in the logo's row) are measured
+from the logo's top left corner instead, like crop_match_name.
+"""
+import json
+import dataclasses
+from pathlib import Path
+from . import consts, ocr, util
+from .frame import image_of
+
+# roinator region types
+NUMBER = "Number"
+TEXT = "Text"
+IMAGE = "Image"
+
+# what a region is measured from
+BAND = "band"
+LOGO = "logo"
+
+# region names pass1 reads (see ExtractionPlan.match_fields). team regions are every region whose name starts with
+# the prefix, in name order, e.g. left_team1 and left_team2
+NAME = "name"
+TIMER = "timer"
+LEFT_TEAMS = "left_team"
+RIGHT_TEAMS = "right_team"
+
+# {(img_w, img_h): (band, logo)} of the reference images in roinator/templates. pp.png has the logo
+# (matchers.EnergizeLogoMatcher's template) at (3, 5), and the band starts at its bottom edge
+PP_REFERENCE = {(1918, 254): ((0, 69, 1918, 180), (3, 5))}
+
+# how far a reference band's width/height can be from a real band's before the layout is rejected
+BAND_ASPECT_TOL = 0.05
+
+# the layout of the current season's display, drawn on pp.png. same regions as the ScaledParams offsets
+DEFAULT_LAYOUT = str(Path(__file__).parent / "templates" / "pp_layout.json")
+
+
+@dataclasses.dataclass
+class Region:
+    """one ROI, as fractions (0-1) of the reference band's width and height, measured from the band's top left
+    corner (anchor BAND) or the logo's (anchor LOGO)"""
+    name: str
+    rtype: str
+    x: float
+    y: float
+    w: float
+    h: float
+    anchor: str = BAND
+
+    def offsets(self, band_w, band_h, is_top=False):
+        """(top, bottom, left, right) pixel offsets of this region from its anchor, for a band_w x band_h band"""
+        y0, y1 = self.y, self.y + self.h
+        if is_top and self.anchor == BAND:
+            y0, y1 = 1 - y1, 1 - y0
+        return (int(round(y0 * band_h)), int(round(y1 * band_h)),
+                int(round(self.x * band_w)), int(round((self.x + self.w) * band_w)))
+
+
+class ExtractionPlan:
+    """reads every region of a compiled layout out of a frame with a match display.
+
+    regions are placed from where the logo was found, like util.get_match_display and the crop_match_* helpers:
+    the band is the full frame width by ScaledParams.DISPLAY_HEIGHT, right below the logo (or right above it,
+    is_top).
+
+    Number regions go through the digit recognizer when there is one and it's confident, Text regions (and
+    unconfident Numbers) are OCRed together in one ocr.read_batch call, and Image regions are reduced to a
+    content hash (the same one the OCR cache uses), so callers can compare them between frames or against a
+    reference crop with image_key().
+    """
+    def __init__(self, regions, digits=None, psm=6):
+        self.regions = regions
+        self.digits = digits
+        self.psm = psm
+        # {(frame height, frame width, is_top): (band height, [(region, offsets)])}
+        self._offsets = {}
+
+    def __iter__(self):
+        return iter(self.regions)
+
+    def __getitem__(self, name):
+        for region in self.regions:
+            if region.name == name:
+                return region
+        raise KeyError(name)
+
+    @staticmethod
+    def image_key(img):
+        """content hash of an Image region crop, tolerant of compression noise"""
+        return ocr.cache.key(img, "image")
+
+    def offsets(self, frame_shape, is_top=False):
+        """(band height, [(region, offsets from its anchor)]) for a frame of frame_shape, worked out once per
+        frame size"""
+        key = (frame_shape[0], frame_shape[1], is_top)
+        if key not in self._offsets:
+            band_w, band_h = frame_shape[1], consts.ScaledParams(frame_shape[1], frame_shape[0]).DISPLAY_HEIGHT
+            self._offsets[key] = band_h, [(region, region.offsets(band_w, band_h, is_top)) for region in self.regions]
+        return self._offsets[key]
+
+    def _crops(self, frame, match_tlbr, is_top):
+        frame = image_of(frame)
+        tl, br = match_tlbr
+        band_h, offsets = self.offsets(frame.shape, is_top)
+        band_top = tl[1] - band_h if is_top else br[1]
+        out = []
+        for region, (top, bottom, left, right) in offsets:
+            y, x = (tl[1], tl[0]) if region.anchor == LOGO else (band_top, 0)
+            out.append((region, frame[max(y + top, 0):max(y + bottom, 0), x + left:x + right]))
+        return out
+
+    def crops(self, frame, match_tlbr, is_top=False):
+        """{name: crop} of every region. frame may be a FrameContext. match_tlbr: where the logo was found,
+        is_top: the display is above it"""
+        return {region.name: crop for region, crop in self._crops(frame, match_tlbr, is_top)}
+
+    def run(self, frame, match_tlbr, is_top=False, changes=None, display_id=0):
+        """returns {name: value}: stripped text for Number/Text regions, a hash (bytes) for Image regions.
+        match_tlbr and is_top as for crops().
+        changes: optional ocr.ChangeDetector, regions other than the timer are only read again once their crop
+        changes. slots are (region name, display_id)"""
+        values = {}
+        todo = []
+        for region, crop in self._crops(frame, match_tlbr, is_top):
+            if region.rtype == IMAGE:
+                values[region.name] = self.image_key(crop)
+                continue
+            # the timer changes every second, it's always read
+            slot = (region.name, display_id) if changes is not None and region.name != TIMER else None
+            text, small = changes.lookup(slot, crop) if slot is not None else (None, None)
+            if text is None and region.rtype == NUMBER:
+                text = util.read_digits(crop, self.digits)
+                if text is not None and slot is not None:
+                    changes.store(slot, small, text)
+            if text is None:
+                todo.append((region, crop, slot, small))
+            else:
+                values[region.name] = text.strip()
+
+        # each region name is its own OCR cache namespace
+        texts = ocr.read_batch([(region.name, crop) for region, crop, _, _ in todo], psm=self.psm)
+        for (region, _, slot, small), text in zip(todo, texts):
+            values[region.name] = text.strip()
+            if slot is not None:
+                changes.store(slot, small, values[region.name])
+        return values
+
+    def check_match_fields(self):
+        """raises ValueError if the plan is missing regions pass1 needs"""
+        names = [region.name for region in self.regions]
+        missing = [name for name in (NAME, TIMER) if name not in names]
+        missing += [prefix + "*" for prefix in (LEFT_TEAMS, RIGHT_TEAMS) if not any(n.startswith(prefix) for n in names)]
+        if missing:
+            raise ValueError(f"layout has no {', '.join(missing)} regions")
+
+    @staticmethod
+    def match_fields(values):
+        """(name, timer text, left teams, right teams) out of run()'s values, like util.extract_match_fields"""
+        def teams(prefix):
+            return [team for name in sorted(values) if name.startswith(prefix) for team in values[name].split()]
+        return values.get(NAME, ""), values.get(TIMER, ""), teams(LEFT_TEAMS), teams(RIGHT_TEAMS)
+
+
+class Layout:
+    """a roinator layout.
+    img_size: (w, h) of the reference image the regions were drawn on
+    band: (x, y, w, h) of the match display band in the reference image. defaults to PP_REFERENCE for pp.png's
+        size, otherwise to the whole image
+    logo: (x, y) of the logo's top left corner in the reference image, needed if any region is outside the band
+    """
+    def __init__(self, rois, img_size, band=None, logo=None):
+        self.rois = rois
+        self.img_size = tuple(img_size)
+        ref_band, ref_logo = PP_REFERENCE.get(self.img_size, ((0, 0) + self.img_size, None))
+        self.band = tuple(band) if band is not None else ref_band
+        self.logo = tuple(logo) if logo is not None else ref_logo
+
+        # a band is the full frame width by ScaledParams.DISPLAY_HEIGHT, whatever the resolution
+        base = consts.ScaledParams(1920, 1080)
+        aspect = self.band[2] / self.band[3] * base.DISPLAY_HEIGHT / base.in_width
+        if abs(aspect - 1) > BAND_ASPECT_TOL:
+            raise ValueError(f"band {self.band[2]}x{self.band[3]} isn't shaped like a match display band "
+                             f"({base.in_width}x{base.DISPLAY_HEIGHT}), give the band's position in the "
+                             f"{self.img_size[0]}x{self.img_size[1]} reference image")
+
+    @classmethod
+    def load(cls, path, band=None, logo=None):
+        """band/logo override the file's"""
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["roi"], (data["img_w"], data["img_h"]), band if band is not None else data.get("band"),
+                   logo if logo is not None else data.get("logo"))
+
+    def compile(self, digits=None, psm=6, include_hidden=False):
+        """returns an ExtractionPlan with the regions relative to the reference band, so they scale to whatever
+        frame size it's run on. hidden regions are skipped unless include_hidden.
+        """
+        band_x, band_y, band_w, band_h = self.band
+        regions = []
+        for roi in self.rois:
+            if not roi.get("visible", True) and not include_hidden:
+                continue
+            x, y = roi["x"] - band_x, roi["y"] - band_y
+            anchor = BAND
+            if not 0 <= y + roi["h"] / 2 < band_h:
+                # the match name and anything else in the logo's row
+                if self.logo is None:
+                    raise ValueError(f"region {roi['name']!r} is outside the band and the layout has no logo position")
+                x, y = roi["x"] - self.logo[0], roi["y"] - self.logo[1]
+                anchor = LOGO
+            regions.append(Region(roi["name"], roi.get("rtype", NUMBER), x / band_w, y / band_h,
+                                  roi["w"] / band_w, roi["h"] / band_h, anchor))
+        return ExtractionPlan(regions, digits=digits, psm=psm)
+
+
+def load_plan(path=DEFAULT_LAYOUT, digits=None, band=None, logo=None, **kwargs):
+    """Layout.load(path, band, logo).compile(...)"""
+    return Layout.load(path, band=band, logo=logo).compile(digits=digits, **kwargs)
@@ -2,13 +2,32 @@ import cv2
 import numpy as np
 from pathlib import Path
 from . import consts
+from .frame import FrameContext
 import os
 
+def scale_gray(frame, size):
+    """frame converted to grayscale and resized to size (w, h). frame may be BGR, grayscale, or a FrameContext"""
+    if isinstance(frame, FrameContext):
+        return frame.scaled_gray(size)
+    gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    # readers that already downscale (like the ffmpeg pipe) hand us frames at the compare size
+    return gray if size == (gray.shape[1], gray.shape[0]) else cv2.resize(gray, size)
+
 class TemplateMatcher:
     """base class for grayscale image template matching
     handles downscaling and matching a single object 
+
+    with track=True, match() first looks in a small window around where the template was last found and the
+    same spot mirrored top to bottom (where the match display goes when it flips), and only searches the
+    whole frame on a miss or every revalidate tracked matches.
+
+    with pyramid > 1, searches correlate at 1/pyramid scale first and then only refine the pyramid_top_k best
+    coarse peaks (scoring at least threshold - pyramid_tol) at full resolution. the threshold always applies
+    to the full resolution score.
     """ 
-    def real_init(self, in_width, in_height, template, scale_size=(1280, 720), threshold=0.5):
+    def real_init(self, in_width, in_height, template, scale_size=(1280, 720), threshold=0.5,
+                  track=False, track_margin=consts.LOGO_TRACK_MARGIN, revalidate=consts.LOGO_TRACK_REVALIDATE,
+                  pyramid=1, pyramid_top_k=consts.TEMPLATE_PYRAMID_TOP_K, pyramid_tol=consts.TEMPLATE_PYRAMID_TOL):
         self.width = in_width
         self.height = in_height
         self.threshold = threshold
@@ -23,33 +42,173 @@ class TemplateMatcher:
         self.scaled_template = cv2.resize(self.template, (int(self.template.shape[1] * self.compare_ratio[0]),
                                                           int(self.template.shape[0] * self.compare_ratio[1])))
 
+        self.track = track
+        self.track_margin = track_margin
+        self.revalidate = revalidate
+        # top left of the last match in scaled coords, and tracked matches since the last full search
+        self.last_loc = None
+        self.since_full = 0
+        self.search_stats = {"full": 0, "tracked": 0}
+
+        self.pyramid = pyramid
+        self.pyramid_top_k = pyramid_top_k
+        self.pyramid_tol = pyramid_tol
+        th, tw = self.scaled_template.shape
+        if pyramid > 1 and min(tw, th) // pyramid >= self.MIN_COARSE_TEMPLATE:
+            self.coarse_template = cv2.resize(self.scaled_template, (tw // pyramid, th // pyramid), interpolation=cv2.INTER_AREA)
+        else:
+            # template too small to survive downscaling, always search at full resolution
+            self.coarse_template = None
+
+    # smallest coarse template side the pyramid search will use
+    MIN_COARSE_TEMPLATE = 8
+
     def match(self, frame):
         """
         returns True, ((tl_x, tl_y), (w, h)) if match else False, None
         """
-        _, max_val, __, max_loc = cv2.minMaxLoc(self.match_template(frame))
+        scaled = self.scale_frame(frame)
+        max_val, max_loc = None, None
+        if self.track and self.last_loc is not None and self.since_full < self.revalidate:
+            max_val, max_loc = self.match_near(scaled)
+            if max_val >= self.threshold:
+                self.since_full += 1
+                self.search_stats["tracked"] += 1
+            else:
+                max_val = None
+
+        if max_val is None:
+            max_val, max_loc = self.search(scaled)
+            self.since_full = 0
+            self.search_stats["full"] += 1
+            # only track from a hit, so frames without a display don't pay for a window search too
+            self.last_loc = max_loc if max_val >= self.threshold else None
+
         if max_val >= self.threshold:
-            tl = (int(max_loc[0] / self.compare_ratio[0]), int(max_loc[1] / self.compare_ratio[1]))
-            wh = (self.template.shape[1], self.template.shape[0])
-            return True, (tl, (tl[0] + wh[0], tl[1] + wh[1]))
+            self.last_loc = max_loc
+            return True, self.to_tlbr(max_loc)
         else:
             return False, None
+
+    def to_tlbr(self, loc):
+        """top left in scaled coords -> ((tl_x, tl_y), (br_x, br_y)) in input coords"""
+        tl = (int(loc[0] / self.compare_ratio[0]), int(loc[1] / self.compare_ratio[1]))
+        wh = (self.template.shape[1], self.template.shape[0])
+        return tl, (tl[0] + wh[0], tl[1] + wh[1])
+
+    def match_all(self, frame, max_instances=consts.MAX_DISPLAYS):
+        """every instance of the template in frame, for streams showing several fields.
+        returns [(score, ((tl_x, tl_y), (br_x, br_y)))] of up to max_instances non-overlapping peaks scoring at least
+        threshold, best first. costs one correlation pass like match() (no tracking).
+        """
+        scaled = self.scale_frame(frame)
+        th, tw = self.scaled_template.shape
+        if self.coarse_template is None or scaled.shape[0] < th * 2 or scaled.shape[1] < tw * 2:
+            res = cv2.matchTemplate(scaled, self.scaled_template, cv2.TM_CCOEFF_NORMED)
+            peaks = self.find_peaks(res, self.threshold, (tw, th), max_instances)
+        else:
+            # coarse peaks, each refined at full resolution
+            coarse = cv2.resize(scaled, (scaled.shape[1] // self.pyramid, scaled.shape[0] // self.pyramid), interpolation=cv2.INTER_AREA)
+            res = cv2.matchTemplate(coarse, self.coarse_template, cv2.TM_CCOEFF_NORMED)
+            fx, fy = scaled.shape[1] / coarse.shape[1], scaled.shape[0] / coarse.shape[0]
+            cth, ctw = self.coarse_template.shape
+            m = self.pyramid * 2
+            peaks = []
+            for _, (cx, cy) in self.find_peaks(res, self.threshold - self.pyramid_tol, (ctw, cth), max_instances * self.pyramid_top_k):
+                x, y = int(cx * fx), int(cy * fy)
+                x0, y0 = max(x - m, 0), max(y - m, 0)
+                x1, y1 = min(x + tw + m, scaled.shape[1]), min(y + th + m, scaled.shape[0])
+                _, val, __, loc = cv2.minMaxLoc(cv2.matchTemplate(scaled[y0:y1, x0:x1], self.scaled_template, cv2.TM_CCOEFF_NORMED))
+                if val >= self.threshold:
+                    peaks.append((val, (loc[0] + x0, loc[1] + y0)))
+            peaks = self.suppress(sorted(peaks, reverse=True), (tw, th), max_instances)
+        return [(score, self.to_tlbr(loc)) for score, loc in peaks]
+
+    @classmethod
+    def find_peaks(cls, res, threshold, wh, max_instances):
+        """local maxima of a matchTemplate result scoring at least threshold, after non-maximum suppression.
+        returns [(score, (x, y))] best first"""
+        local_max = (res >= threshold) & (res == cv2.dilate(res, np.ones((3, 3), np.uint8)))
+        ys, xs = np.nonzero(local_max)
+        scores = res[ys, xs]
+        order = np.argsort(-scores, kind="stable")
+        return cls.suppress([(float(scores[i]), (int(xs[i]), int(ys[i]))) for i in order], wh, max_instances)
+
+    @staticmethod
+    def suppress(peaks, wh, max_instances):
+        """greedy non-maximum suppression: drops peaks whose template box overlaps a better one's"""
+        kept = []
+        for score, (x, y) in peaks:
+            if all(abs(x - kx) >= wh[0] or abs(y - ky) >= wh[1] for _, (kx, ky) in kept):
+                kept.append((score, (x, y)))
+                if len(kept) >= max_instances:
+                    break
+        return kept
+
+    def search(self, scaled):
+        """best (score, top left) of the template over a whole scaled frame"""
+        th, tw = self.scaled_template.shape
+        # not worth it unless the frame is much bigger than the template
+        if self.coarse_template is None or scaled.shape[0] < th * 2 or scaled.shape[1] < tw * 2:
+            _, max_val, __, max_loc = cv2.minMaxLoc(cv2.matchTemplate(scaled, self.scaled_template, cv2.TM_CCOEFF_NORMED))
+            return max_val, max_loc
+
+        coarse = cv2.resize(scaled, (scaled.shape[1] // self.pyramid, scaled.shape[0] // self.pyramid), interpolation=cv2.INTER_AREA)
+        res = cv2.matchTemplate(coarse, self.coarse_template, cv2.TM_CCOEFF_NORMED)
+        fx, fy = scaled.shape[1] / coarse.shape[1], scaled.shape[0] / coarse.shape[0]
+        cth, ctw = self.coarse_template.shape
+        m = self.pyramid * 2
+
+        best_val, best_loc = -1.0, (0, 0)
+        for _ in range(self.pyramid_top_k):
+            _, val, __, (cx, cy) = cv2.minMaxLoc(res)
+            if val < self.threshold - self.pyramid_tol:
+                break
+            # suppress this peak so the next pass finds a different one
+            res[max(cy - cth // 2, 0):cy + cth // 2 + 1, max(cx - ctw // 2, 0):cx + ctw // 2 + 1] = -1
+
+            x, y = int(cx * fx), int(cy * fy)
+            x0, y0 = max(x - m, 0), max(y - m, 0)
+            x1, y1 = min(x + tw + m, scaled.shape[1]), min(y + th + m, scaled.shape[0])
+            _, val, __, loc = cv2.minMaxLoc(cv2.matchTemplate(scaled[y0:y1, x0:x1], self.scaled_template, cv2.TM_CCOEFF_NORMED))
+            if val > best_val:
+                best_val, best_loc = val, (loc[0] + x0, loc[1] + y0)
+        return best_val, best_loc
+
+    def match_near(self, scaled):
+        """best (score, top left) in the windows around last_loc and its top/bottom mirror"""
+        th, tw = self.scaled_template.shape
+        x, y = self.last_loc
+        m = self.track_margin
+        best_val, best_loc = -1.0, None
+        for wy in (y, scaled.shape[0] - th - y):
+            x0, y0 = max(x - m, 0), max(wy - m, 0)
+            x1, y1 = min(x + tw + m, scaled.shape[1]), min(wy + th + m, scaled.shape[0])
+            if x1 - x0 < tw or y1 - y0 < th:
+                continue
+            _, val, __, loc = cv2.minMaxLoc(cv2.matchTemplate(scaled[y0:y1, x0:x1], self.scaled_template, cv2.TM_CCOEFF_NORMED))
+            if val > best_val:
+                best_val, best_loc = val, (loc[0] + x0, loc[1] + y0)
+        return best_val, best_loc
+
+    def scale_frame(self, frame):
+        """grayscale frame at the compare size. frame may already be grayscale, or a FrameContext"""
+        scaled_size = (int(frame.shape[1] * self.scale_size[0] / self.width), int(frame.shape[0] * self.scale_size[1] / self.height))
+        return scale_gray(frame, scaled_size)
     
     def match_template(self, frame):
-        """return cv2.matchTemplate results"""
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        scaled = cv2.resize(gray, (int(gray.shape[1] * self.scale_size[0] / self.width), int(gray.shape[0] * self.scale_size[1] / self.height)))
-        return cv2.matchTemplate(scaled, self.scaled_template, cv2.TM_CCOEFF_NORMED)
+        """return cv2.matchTemplate results. frame may already be grayscale"""
+        return cv2.matchTemplate(self.scale_frame(frame), self.scaled_template, cv2.TM_CCOEFF_NORMED)
 
 class ParamMatcher(TemplateMatcher):
     THRESH = 0.8
     IMG_PATH = "templates/en.png"
-    def __init__(self, params: consts.ScaledParams, en_name=None):
+    def __init__(self, params: consts.ScaledParams, en_name=None, **match_opts):
         en_name = en_name or str(Path(os.path.dirname(__file__))/self.IMG_PATH)
         template = cv2.imread(en_name)
         template = cv2.resize(template, (params.scalex(template.shape[1]), params.scaley(template.shape[0])))
 
-        self.real_init(params.in_width, params.in_height, template, threshold=self.THRESH)
+        self.real_init(params.in_width, params.in_height, template, threshold=self.THRESH, **match_opts)
 
 
 class EnergizeLogoMatcher(ParamMatcher):
@@ -66,19 +225,235 @@ class PPCapMatcher(ParamMatcher):
         Checks if the endgame caps exist, as this determines if this is auto/switchover or teleop. 
         Will work on scored caps even though they are colored differently 
 
-        match_display: as returned by get_match_display
+        match_display: as returned by get_match_display, or a FrameContext of it
         params: ScaledParams 
         """
         left_win = match_display[:, params.CAP_LEFT_OFFSET:params.CAP_LEFT_OFFSET + params.CAP_WIDTH, :]
         right_win = match_display[:, params.CAP_RIGHT_OFFSET:params.CAP_RIGHT_OFFSET + params.CAP_WIDTH, :]
 
-        left_matches = self.match_template(left_win)
-        right_matches = self.match_template(right_win)
+        left_max, _ = self.search(self.scale_frame(left_win))
+        right_max, _ = self.search(self.scale_frame(right_win))
 
-        return np.any(left_matches > self.THRESH) or np.any(right_matches > self.THRESH) #, np.max(left_matches), np.max(right_matches)
+        return left_max > self.THRESH or right_max > self.THRESH
         #return util.DictStruct(locals())
 
 
+class TemplateBank:
+    """matches many templates against a frame at once, e.g. the logos of several seasons or overlay styles.
+
+    uses FFT cross correlation: the frame is transformed once per call, every template's transform is
+    precomputed, and all the products are inverse transformed as one batch. the window normalization
+    comes from integral images, shared by all templates of the same size. scores are the same
+    TM_CCOEFF_NORMED scores cv2.matchTemplate gives.
+
+    with pyramid > 1 the FFT pass runs at 1/pyramid scale, and only each template's pyramid_top_k best
+    coarse peaks are rescored at full resolution (like TemplateMatcher's pyramid search), so an extra
+    template costs a small inverse FFT and a few tiny matchTemplate calls instead of a full search.
+
+    templates: {name: path or BGR image}, drawn for ScaledParams.BASE_IMSIZE like the ones in templates/
+    threshold: lowest score match() accepts
+    """
+    def __init__(self, params: consts.ScaledParams, templates, threshold=consts.ENERGIZE_LOGO_MATCH_THR, scale_size=(1280, 720),
+                 pyramid=consts.TEMPLATE_PYRAMID_FACTOR, pyramid_top_k=consts.TEMPLATE_PYRAMID_TOP_K, pyramid_tol=consts.TEMPLATE_PYRAMID_TOL):
+        self.width = params.in_width
+        self.height = params.in_height
+        self.threshold = threshold
+        self.scale_size = scale_size
+        self.compare_size = (min(scale_size[0], self.width), min(scale_size[1], self.height))
+        self.compare_ratio = (self.compare_size[0] / self.width, self.compare_size[1] / self.height)
+
+        self.names = []
+        # (w, h) of each template at the input resolution, and the grayscale templates at the compare size
+        self.sizes = []
+        self.scaled_templates = []
+        for name, template in templates.items():
+            if isinstance(template, (str, Path)):
+                template = cv2.imread(str(template))
+            template = cv2.resize(template, (params.scalex(template.shape[1]), params.scaley(template.shape[0])))
+            gray = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
+            self.names.append(name)
+            self.sizes.append((gray.shape[1], gray.shape[0]))
+            self.scaled_templates.append(cv2.resize(gray, (int(gray.shape[1] * self.compare_ratio[0]),
+                                                           int(gray.shape[0] * self.compare_ratio[1]))))
+
+        self.pyramid_top_k = pyramid_top_k
+        self.pyramid_tol = pyramid_tol
+        if pyramid > 1 and all(min(t.shape) // pyramid >= TemplateMatcher.MIN_COARSE_TEMPLATE for t in self.scaled_templates):
+            self.pyramid = pyramid
+            levels = [cv2.resize(t, (t.shape[1] // pyramid, t.shape[0] // pyramid), interpolation=cv2.INTER_AREA)
+                      for t in self.scaled_templates]
+        else:
+            self.pyramid = 1
+            levels = self.scaled_templates
+
+        # zero mean templates at the FFT pass's scale
+        self.kernels = []
+        for t in levels:
+            kernel = t.astype(np.float32)
+            kernel -= kernel.mean()
+            self.kernels.append(kernel)
+        self.kernel_norms = [float(np.sqrt(np.sum(np.square(k, dtype=np.float64)))) for k in self.kernels]
+
+        # template spectra, computed for the first frame size seen
+        self._fft_shape = None
+        self._spectra = None
+        # name of the template match() last returned
+        self.last_name = None
+
+    @classmethod
+    def from_paths(cls, params: consts.ScaledParams, paths, **kwargs):
+        """bank of template image files, named after the file names"""
+        return cls(params, {Path(p).stem: p for p in paths}, **kwargs)
+
+    def scale_frame(self, frame):
+        scaled_size = (int(frame.shape[1] * self.scale_size[0] / self.width), int(frame.shape[0] * self.scale_size[1] / self.height))
+        return scale_gray(frame, scaled_size)
+
+    def _prepare(self, shape):
+        fft_shape = (cv2.getOptimalDFTSize(shape[0]), cv2.getOptimalDFTSize(shape[1]))
+        if fft_shape != self._fft_shape:
+            # conjugated so multiplying by the frame's spectrum correlates instead of convolving
+            self._spectra = np.conj(np.stack([np.fft.rfft2(k, s=fft_shape) for k in self.kernels]))
+            self._fft_shape = fft_shape
+        return fft_shape
+
+    def correlate(self, img):
+        """TM_CCOEFF_NORMED score maps of every kernel over the grayscale img (at the FFT pass's scale), in self.names order"""
+        fft_shape = self._prepare(img.shape)
+        spectrum = np.fft.rfft2(img.astype(np.float32), s=fft_shape)
+        # rows/cols past the image are zero padding, correlations that start in the image never wrap into them
+        numerators = np.fft.irfft2(self._spectra * spectrum[None], s=fft_shape)
+
+        sums, sq_sums = cv2.integral2(img, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+        window_vars = {}
+        results = []
+        for kernel, norm, numerator in zip(self.kernels, self.kernel_norms, numerators):
+            th, tw = kernel.shape
+            h, w = img.shape[0] - th + 1, img.shape[1] - tw + 1
+            if h <= 0 or w <= 0:
+                results.append(np.full((1, 1), -1, dtype=np.float32))
+                continue
+            if (th, tw) not in window_vars:
+                box = lambda ii: ii[th:th + h, tw:tw + w] - ii[:h, tw:tw + w] - ii[th:th + h, :w] + ii[:h, :w]
+                s, sq = box(sums), box(sq_sums)
+                window_vars[th, tw] = np.maximum(sq - s * s / (th * tw), 0)
+            denom = np.sqrt(window_vars[th, tw]) * norm
+            # flat windows can't correlate with anything
+            score = np.where(denom > 1e-6, numerator[:h, :w] / np.maximum(denom, 1e-6), 0)
+            results.append(score.astype(np.float32))
+        return results
+
+    def _refine(self, scaled, template, coarse_score, fx, fy):
+        """best full resolution (score, top left) around the top coarse peaks"""
+        th, tw = template.shape
+        cth, ctw = th // self.pyramid, tw // self.pyramid
+        m = self.pyramid * 2
+        best_val, best_loc = -1.0, (0, 0)
+        for _ in range(self.pyramid_top_k):
+            _, val, __, (cx, cy) = cv2.minMaxLoc(coarse_score)
+            if val < self.threshold - self.pyramid_tol:
+                break
+            coarse_score[max(cy - cth // 2, 0):cy + cth // 2 + 1, max(cx - ctw // 2, 0):cx + ctw // 2 + 1] = -1
+
+            x, y = int(cx * fx), int(cy * fy)
+            x0, y0 = max(x - m, 0), max(y - m, 0)
+            x1, y1 = min(x + tw + m, scaled.shape[1]), min(y + th + m, scaled.shape[0])
+            if x1 - x0 < tw or y1 - y0 < th:
+                continue
+            _, val, __, loc = cv2.minMaxLoc(cv2.matchTemplate(scaled[y0:y1, x0:x1], template, cv2.TM_CCOEFF_NORMED))
+            if val > best_val:
+                best_val, best_loc = val, (loc[0] + x0, loc[1] + y0)
+        return best_val, best_loc
+
+    def match_all(self, frame):
+        """{name: (score, ((tl_x, tl_y), (br_x, br_y)))} of each template's best location, in input coordinates"""
+        scaled = self.scale_frame(frame)
+        if self.pyramid > 1:
+            coarse = cv2.resize(scaled, (scaled.shape[1] // self.pyramid, scaled.shape[0] // self.pyramid), interpolation=cv2.INTER_AREA)
+            fx, fy = scaled.shape[1] / coarse.shape[1], scaled.shape[0] / coarse.shape[0]
+            best = [self._refine(scaled, t, score, fx, fy) for t, score in zip(self.scaled_templates, self.correlate(coarse))]
+        else:
+            best = [cv2.minMaxLoc(score)[1::2] for score in self.correlate(scaled)]
+
+        out = {}
+        for name, (w, h), (max_val, max_loc) in zip(self.names, self.sizes, best):
+            tl = (int(max_loc[0] / self.compare_ratio[0]), int(max_loc[1] / self.compare_ratio[1]))
+            out[name] = (max_val, (tl, (tl[0] + w, tl[1] + h)))
+        return out
+
+    def match(self, frame):
+        """like TemplateMatcher.match, for the best scoring template. its name is left in last_name"""
+        results = self.match_all(frame)
+        name = max(results, key=lambda n: results[n][0], default=None)
+        if name is not None and results[name][0] >= self.threshold:
+            self.last_name = name
+            return True, results[name][1]
+        self.last_name = None
+        return False, None
+
+
+class HueClassifier:
+    """labels pixels by which of a set of hues they're within tolerance of, with one HSV conversion and one cv2.LUT.
+
+    hues: list of color names (see BlobMatcher.colors) or opencv hue values (0-179).
+    by default the labels are exactly what the old per-hue cv2.inRange thresholds gave: hue +- tolerance, clipped
+    to 0-255 and wrapping around at 256, so red (179) only takes in 174-179.
+    wrap: hue distance wraps around at 180 instead (opencv's hue range), so red also takes in 0-4. black, white and
+        gray pixels have hue 0, so pair it with min_sat/min_val
+    min_sat/min_val: pixels with less saturation or value are always 0
+    pixels close to several hues get the first one's label.
+    labels are 0 for no class and i + 1 for hues[i].
+    """
+    # opencv's 8 bit hue range
+    HUE_RANGE = 180
+
+    def __init__(self, hues, tolerance=5, wrap=False, min_sat=0, min_val=0):
+        self.names = list(hues)
+        self.tolerance = tolerance
+        self.wrap = wrap
+        self.min_sat = min_sat
+        self.min_val = min_val
+        self.lut = np.zeros(256, dtype=np.uint8)
+        values = np.arange(256)
+        # pick the first class per hue value, so fill in reverse
+        for i, hue in reversed(list(enumerate(self.names))):
+            hue = BlobMatcher.colors.get(hue, hue)
+            if wrap:
+                diff = np.abs(values - hue) % self.HUE_RANGE
+                near = (np.minimum(diff, self.HUE_RANGE - diff) <= tolerance) & (values < self.HUE_RANGE)
+            else:
+                near = (values >= hue - tolerance) & (values <= hue + tolerance)
+                # the inRange version's wraparound
+                near |= values >= 256 + hue - tolerance
+                near |= values <= hue + tolerance - 256
+            self.lut[near] = i + 1
+
+    def labels(self, frame, step=1):
+        """label image of a BGR image or FrameContext, taking every step-th row and column"""
+        if isinstance(frame, FrameContext):
+            hsv = frame.hsv[::step, ::step]
+        else:
+            # subsample before converting, it's the conversion that costs
+            hsv = cv2.cvtColor(np.ascontiguousarray(frame[::step, ::step]), cv2.COLOR_BGR2HSV)
+        hsv = np.ascontiguousarray(hsv)
+        labels = cv2.LUT(cv2.extractChannel(hsv, 0), self.lut)
+        if not self.min_sat and not self.min_val:
+            return labels
+        chromatic = cv2.inRange(hsv, (0, self.min_sat, self.min_val), (255, 255, 255))
+        return cv2.bitwise_and(labels, labels, mask=chromatic)
+
+    def counts(self, frame, step=1):
+        """(number of pixels in each class, number of pixels looked at)"""
+        labels = self.labels(frame, step)
+        counts = np.bincount(labels.ravel(), minlength=len(self.names) + 1)
+        return dict(zip(self.names, counts[1:].tolist())), labels.size
+
+    def fractions(self, frame, step=1):
+        """fraction of the (sampled) pixels in each class"""
+        counts, total = self.counts(frame, step)
+        return {name: n / max(total, 1) for name, n in counts.items()}
+
+
 class BlobMatcher:
     """finds lists of blobs based on HSV color values, like those retroreflective tape finders :3"""
 
@@ -88,27 +463,28 @@ class BlobMatcher:
         "blue": 103, 
         "tan": 21,
     }
+    _classifiers = {}
 
     @classmethod
-    def threshold(cls, frame, hue, tolerance=5):
-        """thresholds an image by hue plus-minus the tolerance. returns same size numpy array."""
-        hue = cls.colors.get(hue, hue)
-
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-        thr = cv2.inRange(hsv, (max(hue - tolerance, 0), 0, 0), (min(hue + tolerance, 255), 255, 255))
+    def classifier(cls, hues, tolerance=5):
+        """shared HueClassifier for hues, set up by consts.HUE_WRAP. the lookup table is only built the first time"""
+        opts = dict(wrap=True, min_sat=consts.HUE_MIN_SAT, min_val=consts.HUE_MIN_VAL) if consts.HUE_WRAP else {}
+        key = (tuple(hues), tolerance, tuple(sorted(opts.items())))
+        if key not in cls._classifiers:
+            cls._classifiers[key] = HueClassifier(hues, tolerance, **opts)
+        return cls._classifiers[key]
 
-        # handle wraparound
-        if (hue - tolerance) < 0:
-            thr2 = cv2.inRange(hsv, ((256 + hue - tolerance) % 256, 0, 0), (255, 255, 255))
-            thr = cv2.bitwise_or(thr, thr2)
+    @classmethod
+    def threshold(cls, frame, hue, tolerance=5):
+        """thresholds an image (or FrameContext) by hue plus-minus the tolerance. returns same size numpy array."""
+        return cls.classifier((hue,), tolerance).labels(frame) * np.uint8(255)
 
-        if (hue + tolerance) > 255:
-            thr2 = cv2.inRange(hsv, (0, 0, 0), ((hue + tolerance) % 256, 255, 255))
-            thr = cv2.bitwise_or(thr, thr2)
-        return thr
+    @classmethod
+    def fractions(cls, frame, hues, tolerance=5, step=1):
+        """fraction of frame's pixels within tolerance of each of hues, in one pass. see HueClassifier"""
+        return cls.classifier(hues, tolerance).fractions(frame, step)
 
     @classmethod
     def find_contours(cls, frame, hue, tolerance=5):
         contours, _ = cv2.findContours(cls.threshold(frame, hue, tolerance=tolerance), cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
         return contours
-
@@ -0,0 +1,327 @@
+"""
+OCR helpers
+
+tesseract is by far the most expensive thing pass1 does per frame, and most of what it reads (match names, team
+lists) doesn't change for the ~150 polls a match is on screen. this module keeps it from re-reading the same crops,
+and lets the engine itself be swapped for one that doesn't fork a process per read (see OCRBackend).
+"""
+import hashlib
+import threading
+import collections
+import numpy as np
+import cv2
+import pytesseract
+
+
+class OCRBackend:
+    """interface for OCR engines. images are BGR, psm is a tesseract page segmentation mode"""
+    def read(self, img, psm=3):
+        """returns the text in img"""
+        raise NotImplementedError
+
+    def read_data(self, img, psm=3):
+        """returns word boxes like pytesseract.image_to_data(output_type=DICT): parallel lists under
+        text, top, height, block_num, par_num and line_num"""
+        raise NotImplementedError
+
+
+class PytesseractBackend(OCRBackend):
+    """runs the tesseract binary through pytesseract. every read forks tesseract and reloads its model"""
+    def __init__(self, lang="eng"):
+        self.lang = lang
+
+    def read(self, img, psm=3):
+        return pytesseract.image_to_string(cv2.cvtColor(img, cv2.COLOR_BGR2RGB), lang=self.lang, config=f"--psm {psm}")
+
+    def read_data(self, img, psm=3):
+        return pytesseract.image_to_data(cv2.cvtColor(img, cv2.COLOR_BGR2RGB), lang=self.lang, config=f"--psm {psm}",
+                                         output_type=pytesseract.Output.DICT)
+
+
+class TesserocrBackend(OCRBackend):
+    """keeps initialized tesseract engines alive in-process through the tesserocr binding (optional dependency).
+
+    engines aren't thread safe, so each thread gets its own, one per psm, created on first use.
+    tesserocr releases the GIL while recognizing, so threads really do run in parallel.
+    """
+    def __init__(self, lang="eng", path=None):
+        import tesserocr
+
+        self.tesserocr = tesserocr
+        self.lang = lang
+        self.path = path
+        self._local = threading.local()
+
+    def _api(self, img, psm):
+        engines = self._local.__dict__.setdefault("engines", {})
+        if psm not in engines:
+            kwargs = {"path": self.path} if self.path else {}
+            engines[psm] = self.tesserocr.PyTessBaseAPI(lang=self.lang, psm=psm, **kwargs)
+        api = engines[psm]
+        rgb = np.ascontiguousarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        api.SetImageBytes(rgb.tobytes(), rgb.shape[1], rgb.shape[0], 3, rgb.strides[0])
+        return api
+
+    def read(self, img, psm=3):
+        return self._api(img, psm).GetUTF8Text()
+
+    def read_data(self, img, psm=3):
+        api = self._api(img, psm)
+        api.Recognize()
+        RIL = self.tesserocr.RIL
+        data = {"text": [], "top": [], "height": [], "block_num": [], "par_num": [], "line_num": []}
+        block = par = line = 0
+        it = api.GetIterator()
+        if it is None:
+            return data
+        for word in self.tesserocr.iterate_level(it, RIL.WORD):
+            if word.IsAtBeginningOf(RIL.BLOCK):
+                block, par, line = block + 1, 0, 0
+            if word.IsAtBeginningOf(RIL.PARA):
+                par, line = par + 1, 0
+            if word.IsAtBeginningOf(RIL.TEXTLINE):
+                line += 1
+            box = word.BoundingBox(RIL.WORD)
+            if box is None:
+                continue
+            data["text"].append(word.GetUTF8Text(RIL.WORD) or "")
+            data["top"].append(box[1])
+            data["height"].append(box[3] - box[1])
+            data["block_num"].append(block)
+            data["par_num"].append(par)
+            data["line_num"].append(line)
+        return data
+
+
+BACKENDS = {
+    "pytesseract": PytesseractBackend,
+    "tesserocr": TesserocrBackend,
+}
+
+# engine used by util.extract_* and read_mosaic
+backend = PytesseractBackend()
+
+def set_backend(name_or_backend, **opts):
+    """switches the shared OCR engine. takes a name from BACKENDS (opts go to its constructor) or an OCRBackend"""
+    global backend
+    if isinstance(name_or_backend, OCRBackend):
+        backend = name_or_backend
+    elif name_or_backend in BACKENDS:
+        backend = BACKENDS[name_or_backend](**opts)
+    else:
+        raise ValueError(f"unknown OCR backend {name_or_backend!r}")
+    return backend
+
+
+class OCRCache:
+    """LRU cache of OCR results keyed by a content hash of the cropped ROI.
+
+    crops are downscaled and quantized before hashing, so compression noise between frames still hits the cache
+    while an actual change in the text doesn't. every ROI kind ("name", "timer", ...) gets its own namespace
+    and its own hit/miss counters.
+
+    maxsize: number of results kept across all namespaces
+    hash_scale: downscale factor applied before hashing
+    quant_bits: low bits of each pixel dropped before hashing
+    """
+    def __init__(self, maxsize=4096, hash_scale=0.5, quant_bits=4):
+        self.maxsize = maxsize
+        self.hash_scale = hash_scale
+        self.quant_bits = quant_bits
+        self.enabled = True
+        self.hits = collections.Counter()
+        self.misses = collections.Counter()
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, img, extra=""):
+        """content hash of img. extra is mixed in, for things like the page segmentation mode"""
+        small = cv2.resize(img, (max(int(img.shape[1] * self.hash_scale), 1), max(int(img.shape[0] * self.hash_scale), 1)),
+                           interpolation=cv2.INTER_AREA)
+        small >>= self.quant_bits
+        h = hashlib.blake2b(small.tobytes(), digest_size=16)
+        h.update(repr((small.shape, extra)).encode())
+        return h.digest()
+
+    def get(self, kind, img, compute, extra=""):
+        """returns the cached result for img in namespace kind, calling compute(img) on a miss"""
+        if not self.enabled:
+            return compute(img)
+
+        key = (kind, self.key(img, extra))
+        result = self.lookup(key)
+        if result is None:
+            result = compute(img)
+            self.store(key, result)
+        return result
+
+    def lookup(self, key):
+        """returns the result stored for a (kind, hash) key and counts the hit/miss, or None"""
+        kind = key[0]
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits[kind] += 1
+                return self._entries[key]
+            self.misses[kind] += 1
+            return None
+
+    def store(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits.clear()
+            self.misses.clear()
+
+    def stats(self):
+        """returns {kind: (hits, misses)}"""
+        return {kind: (self.hits[kind], self.misses[kind]) for kind in set(self.hits) | set(self.misses)}
+
+
+def background(crop):
+    """median color of the crop's outermost rows and columns, taken as its background"""
+    border = np.concatenate([crop[0], crop[-1], crop[:, 0], crop[:, -1]])
+    return np.median(border, axis=0).tolist() if crop.ndim == 3 else float(np.median(border))
+
+def mosaic(crops, sep=16):
+    """tiles BGR crops top to bottom into one image for a single tesseract call.
+    each crop is padded to the widest crop's width, with sep rows around it, in its background color (see
+    background()) so tesseract sees clean line breaks. padding by replicating the edge would smear any text
+    touching it into streaks.
+    returns (mosaic, [(top, bottom) row span of each crop])
+    """
+    width = max(c.shape[1] for c in crops)
+    tiles, spans = [], []
+    top = 0
+    for crop in crops:
+        tile = cv2.copyMakeBorder(crop, sep, sep, 0, width - crop.shape[1], cv2.BORDER_CONSTANT, value=background(crop))
+        spans.append((top + sep, top + sep + crop.shape[0]))
+        top += tile.shape[0]
+        tiles.append(tile)
+    return np.vstack(tiles), spans
+
+def read_mosaic(crops, psm=6):
+    """OCRs many crops with one tesseract invocation. returns the text of each crop, lines joined by newlines"""
+    if not crops:
+        return []
+    image, spans = mosaic(crops)
+    data = backend.read_data(image, psm=psm)
+
+    # crop -> {(block, par, line): [words]}, in tesseract's reading order
+    lines = [collections.OrderedDict() for _ in crops]
+    tops, bottoms = np.array(spans).T
+    for i, word in enumerate(data["text"]):
+        if not word.strip():
+            continue
+        y = data["top"][i] + data["height"][i] / 2
+        # the crop whose span contains the word center, or the nearest one
+        owner = int(np.argmin(np.maximum(tops - y, 0) + np.maximum(y - bottoms, 0)))
+        line = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines[owner].setdefault(line, []).append(word)
+
+    return ["\n".join(" ".join(words) for words in crop_lines.values()) for crop_lines in lines]
+
+def read_batch(items, psm=6, ocr_cache=None):
+    """OCRs a batch of (kind, crop) pairs, possibly from many frames, in one tesseract call.
+    crops already in ocr_cache (defaults to the shared one) skip tesseract entirely.
+    returns the text for each item
+    """
+    ocr_cache = ocr_cache or cache
+    # same key extra as util.extract_text, so batched and single reads share entries
+    extra = f"psm {psm}"
+    results = [None] * len(items)
+    keys = [None] * len(items)
+    misses = []
+    for i, (kind, crop) in enumerate(items):
+        if ocr_cache.enabled:
+            keys[i] = (kind, ocr_cache.key(crop, extra))
+            hit = ocr_cache.lookup(keys[i])
+            if hit is not None:
+                results[i] = hit
+                continue
+        misses.append(i)
+
+    for i, text in zip(misses, read_mosaic([items[i][1] for i in misses], psm=psm)):
+        results[i] = text
+        if ocr_cache.enabled:
+            ocr_cache.store(keys[i], text)
+    return results
+
+
+class ChangeDetector:
+    """remembers the last crop read from each ROI slot and its value, so fields that stay put while a match is on
+    screen (name, team numbers) are only read again when their pixels actually change.
+
+    crops are compared after a grayscale INTER_AREA downscale, which averages away compression noise; a crop
+    counts as changed if any downscaled pixel moved by more than threshold. unlike OCRCache this doesn't need the
+    crop to hash to exactly the same thing as before.
+
+    slot: anything hashable naming the ROI, e.g. ("teams", display_id, "left")
+    """
+    def __init__(self, scale=0.25, threshold=32):
+        self.scale = scale
+        self.threshold = threshold
+        self.enabled = True
+        self.carried = collections.Counter()
+        self.read = collections.Counter()
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def _small(self, img):
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, (max(int(gray.shape[1] * self.scale), 1), max(int(gray.shape[0] * self.scale), 1)),
+                          interpolation=cv2.INTER_AREA)
+
+    def lookup(self, slot, img):
+        """(value, small) where value is the slot's last value if img hasn't changed since, else None.
+        pass small back to store() so the crop isn't downscaled twice"""
+        if not self.enabled:
+            return None, None
+        small = self._small(img)
+        with self._lock:
+            last = self._last.get(slot)
+        if last is not None and self.unchanged(last[0], small):
+            self.carry(slot)
+            return last[1], small
+        return None, small
+
+    def unchanged(self, small, other):
+        """whether two downscaled crops (from lookup) count as the same"""
+        return small.shape == other.shape and cv2.absdiff(small, other).max() <= self.threshold
+
+    def carry(self, slot):
+        """counts a value carried forward for slot"""
+        self.carried[slot[0] if isinstance(slot, tuple) else slot] += 1
+
+    def store(self, slot, small, value):
+        self.read[slot[0] if isinstance(slot, tuple) else slot] += 1
+        if small is not None:
+            with self._lock:
+                self._last[slot] = (small, value)
+
+    def get(self, slot, img, compute):
+        """slot's last value if img hasn't changed, else compute(img)"""
+        value, small = self.lookup(slot, img)
+        if value is None:
+            value = compute(img)
+            self.store(slot, small, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._last.clear()
+        self.carried.clear()
+        self.read.clear()
+
+    def stats(self):
+        """{kind: (carried forward, read)}"""
+        return {kind: (self.carried[kind], self.read[kind]) for kind in set(self.carried) | set(self.read)}
+
+
+# shared by util.extract_* helpers
+cache = OCRCache()
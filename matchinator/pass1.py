@@ -10,11 +10,15 @@ import sys
 import time
 from pathlib import Path
 import numpy as np
-import cv2
 import operator
+import collections
 import dataclasses
 import multiprocessing
-from . import consts, matchers, util
+import json
+from . import consts, digits, matchers, ocr, pipeline, schedule, util, video
+from . import index as display_index
+from . import layout as display_layout
+from .frame import FrameContext
 
 
 ## CONVENTIONS:
@@ -37,6 +41,8 @@ class Pass1EventMatch:
     blue_teams: tuple[str]
     is_replay: bool
     colors_flipped: bool
+    # which match display this came from, for streams showing several fields (see FrameAnalyzer multi_display)
+    display_id: int = 0
 
 @dataclasses.dataclass
 class Pass1EventData:
@@ -45,161 +51,657 @@ class Pass1EventData:
     height: int
     matches: list = dataclasses.field(default_factory=list)
 
+class Pass1Journal:
+    """append-only journal of pass1 results, so a crashed or preempted run can pick up where it left off.
+
+    the journal is a JSON lines file: a meta record, then batches of match records each followed by a
+    checkpoint record holding the video time everything before has been processed up to. batches are only
+    written (and fsynced) at checkpoints, so anything after the last checkpoint is partial and gets redone.
+    """
+    def __init__(self, path, every=60):
+        self.path = path
+        # seconds of video between checkpoints
+        self.every = every
+        self.f = None
+        self.pending = []
+        self.last_checkpoint = None
+        self.last_sec = None
+
+    @staticmethod
+    def load(path):
+        """reads a journal. returns (Pass1EventData, checkpoint sec or None, finished, byte offset of the last checkpoint's end)"""
+        event_data, sec, done, end = None, None, False, 0
+        batch = []
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    # torn write at the end of the file
+                    break
+                if rec["type"] == "meta":
+                    event_data = Pass1EventData(rec["fps"], rec["width"], rec["height"])
+                    end = f.tell()
+                elif rec["type"] == "match":
+                    del rec["type"]
+                    rec["red_teams"] = tuple(rec["red_teams"])
+                    rec["blue_teams"] = tuple(rec["blue_teams"])
+                    batch.append(Pass1EventMatch(**rec))
+                elif rec["type"] == "checkpoint":
+                    event_data.matches.extend(batch)
+                    batch = []
+                    sec, done = rec["sec"], rec.get("done", False)
+                    end = f.tell()
+        return event_data, sec, done, end
+
+    def start(self, event_data, resume=False):
+        """opens the journal for writing. returns (Pass1EventData, checkpoint sec, finished) recovered from an
+        existing journal if resuming, otherwise writes a fresh journal and returns (event_data, None, False)"""
+        sec, done, end = None, False, 0
+        if resume and os.path.exists(self.path):
+            loaded, sec, done, end = self.load(self.path)
+            # an empty journal, or one whose meta line was torn, is started over with the caller's event_data
+            if loaded is not None:
+                event_data = loaded
+
+        if end:
+            self.f = open(self.path, "r+")
+            # drop any partial batch after the last checkpoint
+            self.f.truncate(end)
+            self.f.seek(end)
+        else:
+            self.f = open(self.path, "w")
+            self._write([{"type": "meta", "fps": event_data.fps, "width": event_data.width, "height": event_data.height}])
+        self.last_checkpoint = self.last_sec = sec
+        return event_data, sec, done
+
+    def _write(self, records):
+        self.f.write("".join(json.dumps(rec) + "\n" for rec in records))
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def add(self, match):
+        self.pending.append(match)
+
+    def progress(self, sec):
+        """everything before sec has been processed. checkpoints if it's been long enough"""
+        self.last_sec = sec
+        if self.last_checkpoint is None or sec - self.last_checkpoint >= self.every:
+            self.checkpoint(sec)
+
+    def checkpoint(self, sec, done=False):
+        records = [dict(type="match", **dataclasses.asdict(m)) for m in self.pending]
+        records.append({"type": "checkpoint", "sec": sec, "done": done})
+        self._write(records)
+        self.pending = []
+        self.last_checkpoint = sec
+
+    def close(self):
+        self.f.close()
+
 ## helper functions
 def mult_tuple(t, v):
     return tuple(tv * v for tv in t) 
 
 def run_task(rtd):
     #return run(video_path, en_name=en_name, pout=pout, poll=1, debug=False, seek=seek, fcount=seg_len).matches
-    return run(*rtd.args, **rtd.kwargs).matches
+    matches = run(*rtd.args, **rtd.kwargs).matches
+    if rtd.keep is None:
+        return matches
+    # drop everything read in the overlap, the previous segment owns it
+    lo, hi = rtd.keep
+    return [m for m in matches if lo <= m.video_sec and (hi is None or m.video_sec < hi)]
 
 class RunTaskData:
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, keep=None, **kwargs):
         self.args = args
         self.kwargs = kwargs
+        # (start, end) seconds of results this task is responsible for
+        self.keep = keep
 
-def run_parallel(video_path, threads=None, en_name=None, pout=sys.stderr, poll=1):
-    """Runs all tasks in parallel.
-    *Will not necessarily increase performance lmao 
+def merge_matches(segments):
+    """merges per-segment match lists into one list ordered by time.
+    if two segments report the same frame, the one from the earlier segment wins.
+    """
+    seen = set()
+    merged = []
+    for m in sorted((m for seg in segments for m in seg), key=operator.attrgetter("video_sec")):
+        key = (m.frame_idx, m.top, m.display_id)
+        if key in seen:
+            continue
+        seen.add(key)
+        merged.append(m)
+    return merged
+
+def run_parallel(video_path, threads=None, en_name=None, pout=sys.stderr, poll=1, segments=None, overlap=5, backend="opencv",
+                 reader_opts=None, **run_opts):
+    """Runs the video in parallel, split into time segments.
+
+    each segment seeks (to the keyframe before) its start and starts reading overlap seconds early, so nothing
+    that straddles a segment boundary gets lost. segments start on the same poll grid as a serial run.
+
+    threads: worker processes, defaults to the cpu count
+    segments: number of segments, defaults to 4 per thread so uneven segments even out
+    overlap: seconds each segment reads before its start
+    reader_opts: dict of options for the video reader, see video.open_reader
+    run_opts: other run() options (browse_poll, batch_ocr, digit_model, ...), passed to every segment
     """
+    reader_opts = reader_opts or {}
+    if run_opts.get("multi_display"):
+        # display ids are handed out in order of appearance, so separate segments would number them differently
+        raise ValueError("multi_display isn't supported by run_parallel")
+    # these are set per segment, or would have every segment write the same file
+    clash = {"seek", "fcount", "start_sec", "end_sec", "journal", "resume", "index", "debug", "is_para"} & set(run_opts)
+    if clash:
+        raise ValueError(f"run_parallel doesn't take {', '.join(sorted(clash))}")
 
     threads = threads or os.cpu_count()
+    segments = segments or threads * 4
 
-    cap = cv2.VideoCapture(video_path)
-    cap_len = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = int(cap.get(cv2.CAP_PROP_FPS))
-    p1ed = Pass1EventData(fps, width, height)
-    cap.release()
+    with video.open_reader(video_path, backend, **reader_opts) as reader:
+        duration = reader.duration
+        p1ed = Pass1EventData(int(reader.fps), reader.width, reader.height)
+
+    # segment boundaries sit on the poll grid
+    seg_len = max(int(duration / segments / poll), 1) * poll
+    bounds = [(i * seg_len, (i + 1) * seg_len) for i in range(max(int(np.ceil(duration / seg_len)), 1))]
+    # the last segment runs to the end of the video
+    bounds[-1] = (bounds[-1][0], None)
+
+    tasks = []
+    for start, end in bounds:
+        read_start = max(start - int(np.ceil(overlap / poll)) * poll, 0)
+        tasks.append(RunTaskData(video_path, keep=(start, end), en_name=en_name, poll=poll, debug=False,
+                                 start_sec=read_start, end_sec=end, is_para=True, backend=backend, **run_opts,
+                                 **reader_opts))
 
-    seg_len = cap_len // threads
     with multiprocessing.Pool(threads) as p:
-        res = p.map(run_task, 
-            [RunTaskData(video_path, en_name=en_name, poll=1, debug=False, seek=seek, fcount=seg_len, is_para=True) for seek in range(0, cap_len, seg_len)])
+        res = p.map(run_task, tasks, chunksize=1)
     
-    for matches in res:
-        p1ed.matches.extend(matches)
+    p1ed.matches.extend(merge_matches(res))
     
     return p1ed
     
 
-def run(video_path, en_name=None, pout=sys.stderr, poll=1, debug=False, seek=0, fcount=-1, is_para=False):
+def run(video_path, en_name=None, pout=sys.stderr, poll=1, debug=False, seek=0, fcount=-1, is_para=False,
+        start_sec=None, end_sec=None, browse_poll=None, batch_ocr=False, digit_model=None, journal=None,
+        checkpoint_every=60, resume=False, ocr_workers=0, queue_size=8, track_logo=True, multi_display=False,
+        skip_unchanged=True, skip_ahead=False, ocr_batch_frames=1, index=None, layout=None, backend="opencv",
+        **reader_opts):
     """Runs a fast first pass of the video.
     This will run the pipeline every second in the video, and return a Pass1EventData object
     containing metadata and the timestamps of all frames with a match display on screen. 
-    
+
+    seek/fcount: frame range to run over. start_sec/end_sec take precedence if given
+    browse_poll: poll period while no match display is on screen (e.g. consts.BROWSE_POLL). defaults to poll
+    batch_ocr: read all of a frame's text fields with one tesseract call
+    ocr_batch_frames: with batch_ocr, OCR this many frames' fields per tesseract call, see iter_run
+    digit_model: digits.DigitRecognizer or path to a saved one, reads the timer and team numbers without tesseract
+    journal: path of a Pass1Journal to write results to every checkpoint_every seconds of video
+    resume: reload the journal and continue from its last checkpoint instead of starting over
+    ocr_workers/queue_size: run decode, detection and OCR as a threaded pipeline, see iter_run
+    track_logo: search for the logo near its last position first, see iter_run
+    multi_display: find every match display in a frame (multi-field streams), see iter_run
+    skip_unchanged: only re-read the match name and teams when their crops change, see iter_run
+    skip_ahead: spot check the match clock instead of polling densely through a match, see iter_run
+    index: index.DisplayIndex (or the path of a saved one) from index.build_index. only the spans it marks
+        as possibly having a match display are scanned
+    layout: roinator layout to read the match display's fields through, see iter_run
+    backend: video reader backend, see video.BACKENDS. reader_opts are passed to the reader
+    """
+    if isinstance(index, (str, Path)):
+        index = display_index.DisplayIndex.load(index)
+
+    with video.open_reader(video_path, backend, **reader_opts) as reader:
+        event_data = Pass1EventData(int(reader.fps), reader.width, reader.height)
+
+        jnl = None
+        progress = None
+        if journal is not None:
+            jnl = Pass1Journal(journal, every=checkpoint_every)
+            event_data, resume_sec, done = jnl.start(event_data, resume=resume)
+            if done:
+                jnl.close()
+                return event_data
+            if resume_sec is not None:
+                print(f"resuming from {util.timef(resume_sec * 1000)}", file=pout)
+                start_sec = resume_sec
+            progress = jnl.progress
+
+        if index is None:
+            spans = [(start_sec, end_sec)]
+        else:
+            lo = start_sec if start_sec is not None else seek / reader.fps
+            hi = end_sec if end_sec is not None else (seek + fcount) / reader.fps if fcount > 0 else None
+            spans = index.clip(lo, hi)
+            print(f"scanning {len(spans)} indexed spans", file=pout)
+
+        dbg = None
+        for span_start, span_end in spans:
+            matches = iter_run(video_path, en_name=en_name, pout=pout, poll=poll, debug=debug, seek=seek,
+                               fcount=fcount, is_para=is_para, start_sec=span_start, end_sec=span_end,
+                               browse_poll=browse_poll, batch_ocr=batch_ocr, digit_model=digit_model,
+                               progress=progress, reader=reader, ocr_workers=ocr_workers, queue_size=queue_size,
+                               track_logo=track_logo, multi_display=multi_display, skip_unchanged=skip_unchanged,
+                               skip_ahead=skip_ahead, ocr_batch_frames=ocr_batch_frames, layout=layout)
+            while True:
+                try:
+                    event_match = next(matches)
+                except StopIteration as stop:
+                    dbg = stop.value
+                    break
+                event_data.matches.append(event_match)
+                if jnl is not None:
+                    jnl.add(event_match)
+
+        if jnl is not None:
+            jnl.checkpoint(jnl.last_sec, done=True)
+            jnl.close()
+
+    if debug and dbg is not None:
+        dbg.event_data = event_data
+        return dbg
+    else:
+        return event_data
+
+@dataclasses.dataclass
+class Detection:
+    """a match display found by the cheap per-frame checks"""
+    match_tlbr: tuple
+    match_display: np.ndarray
+    match_is_top: bool
+    is_preview: bool = False
+    # FrameContext of match_display, shares conversions with the detect step
+    display_ctx: FrameContext = None
+    display_id: int = 0
+
+    @property
+    def needs_ocr(self):
+        return not self.is_preview
+
+class DisplayIds:
+    """hands out stable ids to match display positions, so the displays of a multi-field stream can be told apart.
+    a display within tolerance (x, y) pixels of a known position gets that position's id.
+    """
+    def __init__(self, tolerance):
+        self.tolerance = tolerance
+        self.positions = []
+
+    def get(self, tl):
+        for i, (x, y) in enumerate(self.positions):
+            if abs(tl[0] - x) <= self.tolerance[0] and abs(tl[1] - y) <= self.tolerance[1]:
+                return i
+        self.positions.append(tl)
+        return len(self.positions) - 1
+
+class FrameAnalyzer:
+    """the per-frame pass1 pipeline, split into detect() (template/blob checks) and analyze() (OCR and the rest),
+    so they can run on different threads.
+
+    en_name: path of the logo template, or a list of them to look for all at once (matchers.TemplateBank)
+    multi_display: look for every match display in the frame instead of the best one, for streams showing
+        several fields. each gets a display_id by position (DisplayIds)
+    skip_unchanged: only re-read the match name and team numbers when their crops change (ocr.ChangeDetector)
+    layout: read the match name, timer and teams through a roinator layout (the path of one, a layout.Layout or
+        a compiled layout.ExtractionPlan) instead of the ScaledParams offsets. see layout.ExtractionPlan.match_fields
+        for the region names it needs
     """
+    def __init__(self, params: consts.ScaledParams, en_name=None, batch_ocr=False, digit_model=None, track_logo=True,
+                 pyramid=consts.TEMPLATE_PYRAMID_FACTOR, multi_display=False, skip_unchanged=True, layout=None,
+                 debug=False, pout=sys.stderr):
+        self.params = params
+        self.batch_ocr = batch_ocr
+        self.digit_model = digit_model
+        self.debug = debug
+        self.pout = pout
+
+        # read the FIRST Energize logo that appears on the left of the display
+        if isinstance(en_name, (list, tuple)):
+            # several logos (seasons, overlay styles), matched together
+            self.logo_matcher = matchers.TemplateBank.from_paths(params, en_name, pyramid=pyramid)
+        else:
+            self.logo_matcher = matchers.EnergizeLogoMatcher(params, en_name, track=track_logo, pyramid=pyramid)
+        self.cap_matcher = matchers.PPCapMatcher(params, pyramid=pyramid)
+
+        self.multi_display = multi_display
+        if multi_display:
+            if isinstance(self.logo_matcher, matchers.TemplateBank):
+                raise ValueError("multi_display needs a single logo template")
+            self.display_ids = DisplayIds((self.logo_matcher.template.shape[1] // 2, self.logo_matcher.template.shape[0] // 2))
+
+        self.changes = ocr.ChangeDetector(threshold=consts.ROI_CHANGE_THR) if skip_unchanged else None
+
+        if isinstance(layout, (str, Path)):
+            layout = display_layout.Layout.load(layout)
+        if isinstance(layout, display_layout.Layout):
+            layout = layout.compile(digits=digit_model)
+        if layout is not None:
+            layout.check_match_fields()
+        self.plan = layout
+
+        # FrameContext conversions over all frames, see conversion_stats()
+        self.conversions = collections.Counter()
+
+    def detect(self, frame):
+        """returns a Detection for each match display in frame (at most one unless multi_display)"""
+        params = self.params
+        ctx = FrameContext(frame, stats=self.conversions)
+        self.conversions["frames"] += 1
+        if self.multi_display:
+            found = [(tlbr, self.display_ids.get(tlbr[0])) for _, tlbr in self.logo_matcher.match_all(ctx)]
+        else:
+            has_logo, match_tlbr = self.logo_matcher.match(ctx)
+            found = [(match_tlbr, 0)] if has_logo else []
+
+        dets = []
+        # get the topleft and bottomright corners
+        for match_tlbr, display_id in found:
+            # we have a match! (literal)
+            # also crop out the match display part of the frame
+            display_ctx, match_is_top = util.get_match_display(ctx, match_tlbr, params)
+
+            # if this is a match preview we skip it
+            dets.append(Detection(match_tlbr, display_ctx.image, match_is_top, util.match_is_preview(display_ctx),
+                                  display_ctx, display_id))
+        return dets
+
+    def conversion_stats(self):
+        """(computed, saved) image conversions per analyzed frame"""
+        n = self.conversions["frames"] or 1
+        return self.conversions["computed"] / n, self.conversions["saved"] / n
+
+    def analyze(self, vframe: video.Frame, det: Detection):
+        """returns a Pass1EventMatch, or None if the frame doesn't hold a usable match display"""
+        return self.analyze_many([(vframe, det)])[0]
+
+    def analyze_many(self, items):
+        """analyze() for a list of (frame, Detection), possibly from many frames. with batch_ocr, all their
+        text fields go to tesseract in one ocr.read_batch call. returns a Pass1EventMatch or None per item"""
+        if self.plan is not None:
+            # the plan reads all of a display's text with one tesseract call already
+            return [self._analyze(vframe, det, self.read_plan(vframe, det)) for vframe, det in items]
+        if not self.batch_ocr:
+            return [self._analyze(vframe, det) for vframe, det in items]
+
+        params, changes = self.params, self.changes
+        reads = [util.prepare_match_fields(vframe.image, det.match_tlbr, det.match_display, det.match_is_top, params,
+                                           digits=self.digit_model, changes=changes, display_id=det.display_id)
+                 for vframe, det in items]
+
+        # a name/team crop that hasn't changed since an earlier item's in the batch is only read once.
+        # sources: per todo field of every item in turn, (index into requests, whether it's another item's read)
+        requests = []
+        sources = []
+        last = {}
+        for n, rd in enumerate(reads):
+            for i in rd.todo:
+                slot = rd.slots[i]
+                prev = last.get(slot) if changes is not None and slot is not None else None
+                if prev is not None and rd.smalls[i] is not None and changes.unchanged(prev[0], rd.smalls[i]):
+                    sources.append((prev[1], True))
+                    continue
+                if slot is not None and rd.smalls[i] is not None:
+                    last[slot] = (rd.smalls[i], len(requests))
+                sources.append((len(requests), False))
+                requests.append(rd.fields[i])
+        texts = ocr.read_batch(requests)
+
+        results = []
+        srcs = iter(sources)
+        for (vframe, det), rd in zip(items, reads):
+            todo_texts, carried = [], set()
+            for i in rd.todo:
+                src, linked = next(srcs)
+                todo_texts.append(texts[src])
+                if linked:
+                    carried.add(i)
+            fields = util.finish_match_fields(rd, todo_texts, changes, carried)
+            results.append(self._analyze(vframe, det, fields))
+        return results
+
+    def read_plan(self, vframe: video.Frame, det: Detection):
+        """(name, timer text, left teams, right teams) of det read through the layout"""
+        values = self.plan.run(vframe.image, det.match_tlbr, det.match_is_top, changes=self.changes,
+                               display_id=det.display_id)
+        return self.plan.match_fields(values)
+
+    def _analyze(self, vframe: video.Frame, det: Detection, fields=None):
+        """the rest of analyze. fields: (name, timer text, left teams, right teams) if already read (batch_ocr, layout)"""
+        params, digit_model, frame = self.params, self.digit_model, vframe.image
+        match_tlbr, match_display, match_is_top = det.match_tlbr, det.match_display, det.match_is_top
+
+        # we found a match or...something
+        if fields is not None:
+            match_name, timestamp, left_teams, right_teams = fields
+        else:
+            match_name, _ = util.extract_match_name(frame, match_tlbr, params, changes=self.changes, display_id=det.display_id)
+
+        if "Example" in match_name:
+            # this is the example display. ignore.
+            return None
+
+        #  attempt to extract the match timestamp
+        if fields is None:
+            timestamp, _ = util.extract_match_time(match_display, match_is_top, params, digits=digit_model)
+
+        if not util.isint(timestamp):
+            # we discard  non-integer timestamps
+            if self.debug:
+                print("reject timestamp", timestamp, file=self.pout)
+            return None
+        
+        
+        # check if this is teleop or auto
+        display = det.display_ctx if det.display_ctx is not None else match_display
+        is_tele = self.cap_matcher.exists(display, params)
+
+
+        # get whether or not the match display is veversed
+        display_reversed = util.are_colors_flipped(display, params)
+
+        if fields is None:
+            left_teams, right_teams = util.extract_match_teams(match_display, params, digits=digit_model,
+                                                               changes=self.changes, display_id=det.display_id)
+
+        if display_reversed:
+            red_alliance, blue_alliance = tuple(left_teams), tuple(right_teams)
+        else:
+            red_alliance, blue_alliance = tuple(right_teams), tuple(left_teams)
+        
+
+        return Pass1EventMatch(match_name, match_is_top, vframe.idx, vframe.sec, is_tele, int(timestamp), red_alliance, blue_alliance, None, display_reversed,
+                               det.display_id)
+
+def iter_run(video_path, en_name=None, pout=sys.stderr, poll=1, debug=False, seek=0, fcount=-1, is_para=False,
+             start_sec=None, end_sec=None, browse_poll=None, batch_ocr=False, digit_model=None, progress=None,
+             reader=None, ocr_workers=0, queue_size=8, track_logo=True, multi_display=False, skip_unchanged=True,
+             skip_ahead=False, ocr_batch_frames=1, layout=None, backend="opencv", **reader_opts):
+    """Runs the first pass like run(), but yields each Pass1EventMatch as soon as it's found.
+
+    pair with backend="pyav", follow=True to process a live .ts recording while it's still being written;
+    iteration ends when the recording does (see video.TailFile).
+    browse_poll: poll period while no match display is on screen, see schedule.PollScheduler.
+        defaults to poll (fixed rate polling)
+    batch_ocr: read all of a frame's text fields with one tesseract call (util.extract_match_fields)
+    ocr_batch_frames: with batch_ocr, hold back the OCR of frames with a match display until this many have
+        piled up and read all of their fields in one tesseract call (FrameAnalyzer.analyze_many).
+        not supported with ocr_workers or skip_ahead, which need each frame's reads right away
+    digit_model: digits.DigitRecognizer (or a path to a saved one) for reading the timer and team numbers
+        without tesseract
+    progress: called before each frame is read with the time everything before has been analyzed and yielded
+    reader: an already open VideoReader to use instead of opening video_path. it is left open.
+    ocr_workers: if > 0, decode, detection and OCR run concurrently on their own threads (pipeline.Pipeline),
+        with this many OCR threads and queue_size frames buffered between stages. needs fixed rate polling
+    track_logo: look for the Energize logo near where it was last found before searching the whole frame
+        (see matchers.TemplateMatcher)
+    multi_display: report every match display in a frame (multi-field streams), tagged with display_id
+    skip_unchanged: carry the match name and teams forward until their crops change instead of re-reading them
+    skip_ahead: once the match clock is locked onto, only spot check it until teleop is nearly over
+        (see schedule.PollScheduler). needs a reader that can rewind to recover from a wrong prediction
+    layout: read the match name, timer and teams through a roinator layout (e.g. layout.DEFAULT_LAYOUT) instead of
+        the ScaledParams offsets, see FrameAnalyzer
+    with debug=True, the StopIteration value holds this function's locals.
+    """
+
+    if isinstance(digit_model, (str, Path)):
+        digit_model = digits.DigitRecognizer.load(digit_model)
+
+    own_reader = reader is None
+    if own_reader:
+        reader = video.open_reader(video_path, backend, **reader_opts)
 
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened(): 
-        raise RuntimeError("could not open video")
+    # pass1's offsets are relative to the whole frame and its preview/color checks need color
+    if getattr(reader, "crop", None) is not None or getattr(reader, "pix_fmt", "bgr24") != "bgr24":
+        raise ValueError("pass1 needs whole bgr24 frames, the reader's crop and pix_fmt options aren't supported "
+                         "(scale is fine)")
 
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = int(cap.get(cv2.CAP_PROP_FPS))
-    event_data = Pass1EventData(fps, width, height)
+    # readers that sample in the decoder have to sample at least every poll
+    reader.set_period(poll)
+
+    width = reader.width
+    height = reader.height
+    fps = int(reader.fps)
     
 
     #scalex, scaley = np.array([width, height]) / consts.BASE_IMSIZE
     params = consts.ScaledParams(width, height)
 
-    logo_matcher = matchers.EnergizeLogoMatcher(params, en_name)
-    cap_matcher = matchers.PPCapMatcher(params)
-
-    # read the FIRST Energize logo that appears on the left of the display
+    analyzer = FrameAnalyzer(params, en_name, batch_ocr=batch_ocr, digit_model=digit_model, track_logo=track_logo,
+                             multi_display=multi_display, skip_unchanged=skip_unchanged, layout=layout, debug=debug,
+                             pout=pout)
     
-    poll_idx = int(fps * poll)
     assert fps > 0, "fps call returned zero ;w;"
+    if start_sec is None:
+        start_sec = seek / reader.fps
+    if end_sec is None and fcount > 0:
+        end_sec = (seek + fcount) / reader.fps
     
-    idx = seek-1
-    fcnt = 0
-    #cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-    #print("lol")
-    prev_time = time.time()
-    while cap.isOpened():
-        if fcnt >= fcount and fcount > 0:
-            break
-
-        if fcnt > (cap.get(cv2.CAP_PROP_FRAME_COUNT) - 3):
-            time.sleep(10)
-            cap = cv2.VideoCapture(video_path)
-            cap.set(cv2.CAP_PROP_POS_FRAMES, fcnt-1)
+    if ocr_batch_frames > 1 and (ocr_workers > 0 or skip_ahead or not batch_ocr):
+        raise ValueError("ocr_batch_frames needs batch_ocr, and doesn't work with ocr_workers or skip_ahead")
 
-
-        succ, frame = cap.read()
-        if not succ:
-            break
-        idx += 1
-        fcnt += 1
-
-        if idx % 10 == 0:
+    if ocr_workers > 0:
+        if (browse_poll is not None and browse_poll != poll) or skip_ahead:
+            raise ValueError("ocr_workers needs fixed rate polling, browse_poll and skip_ahead aren't supported")
+        pipe = pipeline.Pipeline(reader, analyzer, poll, start_sec, end_sec, ocr_workers=ocr_workers, queue_size=queue_size)
+        prev_time = time.time()
+        for vframe, event_matches in pipe:
+            frame = vframe.image
+            if progress is not None:
+                progress(vframe.sec)
             if not is_para:
                 print(f"time: " 
-                    + util.timef(cap.get(cv2.CAP_PROP_POS_MSEC))
-                    + f" fps: {1 / (time.time() - prev_time):.6f}         ", end="\r", file=pout)
-            elif idx % 300 != 0:
-                print(f"time: " 
-                    + util.timef(cap.get(cv2.CAP_PROP_POS_MSEC))
-                    + f" fps: {1 / (time.time() - prev_time):.6f}         seek: {seek}", file=pout)
+                    + util.timef(vframe.sec * 1000)
+                    + f" fps: {poll * reader.fps / (time.time() - prev_time):.6f}        ", end="\r", file=pout)
+            prev_time = time.time()
+            yield from event_matches
+
+        if not is_para:
+            print("", file=pout)
+            pipe.print_stats(pout)
+            print("ocr cache (hits, misses):", ocr.cache.stats(), file=pout)
+            if analyzer.changes is not None:
+                print("unchanged fields (carried, read):", analyzer.changes.stats(), file=pout)
+            print("image conversions per frame (computed, saved): %.2f, %.2f" % analyzer.conversion_stats(), file=pout)
+        if own_reader:
+            reader.close()
+        if debug:
+            last_det = pipe.last_detection
+            if last_det is not None:
+                match_tlbr, match_display, match_is_top = last_det.match_tlbr, last_det.match_display, last_det.match_is_top
+                tl, br = match_tlbr
+            return util.DictStruct(locals())
+        return
+
+    # the scheduler takes one last sample right before its end, at the end of the video that's the last frame
+    # (duration is 0 if unknown, e.g. live)
+    sched_end = end_sec if end_sec is not None or not reader.duration else reader.duration - 0.5 / reader.fps
+    sched = schedule.PollScheduler(poll, browse_poll=browse_poll, start_sec=start_sec, end_sec=sched_end, rewind=reader.can_rewind,
+                                   skip_ahead=skip_ahead)
+    if start_sec > 0:
+        reader.seek(start_sec)
+    # matches found while the scheduler backfills, held back so everything comes out in time order
+    pending = []
+    # (t, frame, Detection) waiting on OCR (ocr_batch_frames), and how many frames they're from
+    batch = []
+    batch_frames = 0
+
+    def flush_batch():
+        for event_match in analyzer.analyze_many([(vframe, det) for _, vframe, det in batch]):
+            if event_match is not None:
+                pending.append(event_match)
+        batch.clear()
+
+    # the last match display found, for the debug struct
+    last_det = None
+    prev_time = time.time()
+    polls = 0
+    while True:
+        if batch_frames >= ocr_batch_frames:
+            flush_batch()
+            batch_frames = 0
+        if pending and not sched.backfill and not batch:
+            yield from sorted(pending, key=operator.attrgetter("video_sec"))
+            pending = []
+        if progress is not None:
+            # frames still waiting on OCR aren't done yet
+            progress(min([sched.settled] + [t for t, _, _ in batch]))
+
+        t = sched.next_time()
+        if t is None:
+            break
+        vframe = reader.read_at(t)
+        if vframe is None or (end_sec is not None and vframe.sec >= end_sec):
+            break
+        idx, frame = vframe.idx, vframe.image
+        polls += 1
+        if not is_para:
+            print(f"time: " 
+                + util.timef(vframe.sec * 1000)
+                + f" fps: {poll * reader.fps / (time.time() - prev_time):.6f} {sched.state}        ", end="\r", file=pout)
+        elif polls % 10 == 0:
+            print(f"time: " 
+                + util.timef(vframe.sec * 1000)
+                + f" fps: {poll * reader.fps / (time.time() - prev_time):.6f}         start: {util.timef(start_sec * 1000)}", file=pout)
         prev_time = time.time()
 
-        if idx % poll_idx != 0:
+        if ocr_batch_frames > 1 and reader.reuses_buffers:
+            # the detections are held on to past the reader's next reads
+            vframe = type(vframe)(idx, vframe.sec, np.copy(frame))
+            frame = vframe.image
+        dets = analyzer.detect(frame)
+        sched.update(t, vframe.sec, bool(dets))
+        if dets:
+            last_det = dets[-1]
+
+        dets = [det for det in dets if det.needs_ocr]
+        if ocr_batch_frames > 1:
+            batch.extend((t, vframe, det) for det in dets)
+            batch_frames += bool(dets)
             continue
-        # more browse logic here
-
-        has_logo, match_tlbr = logo_matcher.match(frame)
-        if has_logo:
-            # get the topleft and bottomright corners
-
-            # we have a match! (literal)
-            # also crop out the match display part of the frame
-            match_display, match_is_top = util.get_match_display(frame, match_tlbr, params)
-            
-            if util.match_is_preview(match_display):
-                # welp, this is a match preview. next.
-                continue
-            
-            # we found a match or...something
-            match_name, _ = util.extract_match_name(frame, match_tlbr, params)
-
-            if "Example" in match_name:
-                # this is the example display. ignore.
-                continue
-
-            #  attempt to extract the match timestamp
-            timestamp, _ = util.extract_match_time(match_display, match_is_top, params)
-
-            if not util.isint(timestamp):
-                # we discard  non-integer timestamps
-                if debug:
-                    print("reject timestamp", timestamp, file=pout)
-                continue
-            
-            
-            # check if this is teleop or auto
-            is_tele = cap_matcher.exists(match_display, params)
-
-
-            # get whether or not the match display is veversed
-            display_reversed = util.are_colors_flipped(match_display, params)
-
-            left_teams, right_teams = util.extract_match_teams(match_display, params)
-
-            if display_reversed:
-                red_alliance, blue_alliance = tuple(left_teams), tuple(right_teams)
-            else:
-                red_alliance, blue_alliance = tuple(right_teams), tuple(left_teams)
-            
-
-            event_match = Pass1EventMatch(match_name, match_is_top, idx, cap.get(cv2.CAP_PROP_POS_MSEC) / 1000, is_tele, int(timestamp), red_alliance, blue_alliance, None, display_reversed)
-            event_data.matches.append(event_match)
-    cap.release()
+        for det in dets:
+            event_match = analyzer.analyze(vframe, det)
+            if event_match is not None:
+                sched.observe(t, vframe.sec, event_match.name, event_match.is_tele, event_match.match_ts)
+                pending.append(event_match)
+    flush_batch()
+    yield from sorted(pending, key=operator.attrgetter("video_sec"))
+
+    if not is_para:
+        print("\nocr cache (hits, misses):", ocr.cache.stats(), file=pout)
+        if analyzer.changes is not None:
+            print("unchanged fields (carried, read):", analyzer.changes.stats(), file=pout)
+        print("image conversions per frame (computed, saved): %.2f, %.2f" % analyzer.conversion_stats(), file=pout)
+        if skip_ahead:
+            print("skip-ahead:", sched.skip_stats, file=pout)
+    if own_reader:
+        reader.close()
 
     if debug:
+        # what the notebook pokes at, like the old single loop's locals
+        if last_det is not None:
+            match_tlbr, match_display, match_is_top = last_det.match_tlbr, last_det.match_display, last_det.match_is_top
+            tl, br = match_tlbr
         return util.DictStruct(locals())
-    else:
-        return event_data
 
 
 
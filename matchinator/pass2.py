@@ -1,6 +1,7 @@
 import dataclasses
 from typing import List
-from . import util, matchers, consts, pass1
+import numpy as np
+from . import util, matchers, consts, pass1, columns
 
 
 """
@@ -21,7 +22,6 @@ return all match timestamps and clip videos from source using ffmpreg
 
 TODO:
 implement replay suppport
-implement multi-event-in-one-stream detection
 
 """
 @dataclasses.dataclass
@@ -34,6 +34,8 @@ class Pass2EventMatch:
     is_replay: bool
     top: bool
     colors_flipped: bool
+    # pass1 display_id of the display the match was read from
+    display_id: int = 0
 
 def coalese_groups(matches: List[pass1.Pass1EventMatch]):
     """Coalesces match entries into things
@@ -79,68 +81,292 @@ def freq_max(lst, attr):
     return sorted(tbl.keys(), key=lambda k: -tbl[k])[0]
 
 
-def combine_matches(edata: pass1.Pass1EventData):
-    groups: List[List[pass1.Pass1EventMatch]] = coalese_groups(filter_groups(coalese_groups(edata.matches)))
+def split_displays(matches: List[pass1.Pass1EventMatch]):
+    """splits match entries by display_id, keeping their order. returns {display_id: entries}"""
+    displays = {}
+    for mtch in matches:
+        displays.setdefault(mtch.display_id, []).append(mtch)
+    return displays
+
+def runs(codes):
+    """(start index, length) of each run of equal values in codes"""
+    if len(codes) == 0:
+        return np.zeros(0, np.intp), np.zeros(0, np.intp)
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    return starts, np.diff(np.r_[starts, len(codes)])
+
+def first_per_group(groups, n_groups, *keys):
+    """for each group, the index of its first entry when ordered by keys (the first key sorts last, like
+    np.lexsort), or -1 if the group has no entries"""
+    out = np.full(n_groups, -1, np.intp)
+    if len(groups) == 0:
+        return out
+    order = np.lexsort(keys + (groups,))
+    grp = groups[order]
+    first = order[np.r_[True, grp[1:] != grp[:-1]]]
+    out[groups[first]] = first
+    return out
+
+def group_modes(groups, n_groups, values):
+    """most frequent value of each group. ties go to the value seen first in the group, like freq_max"""
+    nvals = int(values.max()) + 1 if len(values) else 1
+    keys, first, counts = np.unique(groups.astype(np.int64) * nvals + values, return_index=True, return_counts=True)
+    best = first_per_group(keys // nvals, n_groups, first, -counts)
+    return keys[best] % nvals
+
+def match_times(auto_max_time, auto_max_ts, tele_max_time, tele_max_ts, tele_min_time, tele_min_ts):
+    """(start, end) video seconds of a match from its largest auto timer, largest and smallest teleop timers
+    and the video times they were read at. any of them may be None if never read"""
+    # we may have only recognized the 8 second switchover
+    if auto_max_time is not None and auto_max_time <= 8:
+        auto_max_time = None
+
+    # logic out the match start and end times
+    if auto_max_time is not None:
+        match_start = max(auto_max_ts - (30 - auto_max_time) - consts.MATCH_PRE_AUTO_START, 0)
+    elif tele_max_time is None:
+        raise RuntimeError("this hsould literally never ahppen bruh")
+    else:
+        match_start = max(tele_max_ts - (120 - tele_max_time) - (38) - consts.MATCH_PRE_AUTO_START, 0)
+
+    if tele_min_time is not None:
+        match_end = tele_min_ts + tele_min_time + consts.MATCH_POST_TELE_END
+    else:
+        match_end = auto_max_ts + auto_max_time + 128 + consts.MATCH_POST_TELE_END
+    return match_start, match_end
+
+def combine_matches(edata):
+    """groups each display's entries separately (multi-field streams interleave them), see combine_display.
+    edata is a pass1.Pass1EventData or a columns.Pass1Columns. converting a Pass1EventData costs about as much as
+    the grouping itself, so store pass1 archives as Pass1Columns (Pass1Columns.save/load) rather than pickles"""
+    if not isinstance(edata, columns.Pass1Columns):
+        edata = columns.Pass1Columns.from_event_data(edata)
+    display_ids = edata.rows["display_id"]
+    # display ids in order of first appearance
+    ids, first = np.unique(display_ids, return_index=True)
     all_matches = []
+    for display_id in ids[np.argsort(first)]:
+        all_matches.extend(combine_display(edata[display_ids == display_id], int(display_id)))
+    if len(ids) > 1:
+        all_matches.sort(key=lambda m: m.start_ts)
+    return all_matches
+
+def combine_display(cols: columns.Pass1Columns, display_id=0):
+    """turns one display's entries into Pass2EventMatches, vectorized over the columns:
+
+    entries are grouped by runs of the same match name, runs shorter than consts.MATCH_GROUP_MIN_COUNT are
+    dropped and the remaining runs regrouped. per group, teams and flags are the most common values, the match
+    starts from the earliest largest auto timer under 30 (unless that's just the 8 second switchover), or failing
+    that the earliest largest teleop timer, and ends at the latest smallest nonzero teleop timer.
+    """
+    rows = cols.rows
+    starts, lengths = runs(rows["name_id"])
+    keep = np.repeat(lengths >= consts.MATCH_GROUP_MIN_COUNT, lengths)
+    rows = rows[keep]
+    top, is_tele = cols.top[keep], cols.is_tele[keep]
+    colors_flipped = cols.colors_flipped[keep]
+    # 0 for unknown (None), 1 for False, 2 for True
+    replay_codes = cols.replay_known[keep].view(np.uint8) + cols.is_replay[keep].view(np.uint8)
 
-    for match_group in groups:
-        # the easy stuff -- just get the most common occurances
-        p2em = Pass2EventMatch(None, None, None, None, None, None, None, None)
-        p2em.name = match_group[0].name
-        p2em.red_teams = freq_max(match_group, "red_teams")
-        p2em.blue_teams = freq_max(match_group, "blue_teams")
-        p2em.is_replay = freq_max(match_group, "is_replay")
-        p2em.colors_flipped = freq_max(match_group, "colors_flipped")
-        p2em.top = freq_max(match_group, "top")
+    starts, _ = runs(rows["name_id"])
+    n_groups = len(starts)
+    groups = np.zeros(len(rows), np.intp)
+    groups[starts[1:]] = 1
+    groups = np.cumsum(groups)
 
-        # now to actually detect where the matches actually are
+    red = group_modes(groups, n_groups, rows["red_id"])
+    blue = group_modes(groups, n_groups, rows["blue_id"])
+    replay = group_modes(groups, n_groups, replay_codes)
+    flipped = group_modes(groups, n_groups, colors_flipped.view(np.uint8))
+    tops = group_modes(groups, n_groups, top.view(np.uint8))
 
-        auto_max_time, auto_max_ts = None, None
-        for auto_match in (c for c in match_group if not c.is_tele):
+    ts = rows["match_ts"].astype(np.int64)
+    idx = np.arange(len(rows))
+    # do not match "30", this is prematch
+    auto = np.flatnonzero(~is_tele & (ts < 30))
+    auto_max = first_per_group(groups[auto], n_groups, idx[auto], -ts[auto])
+    tele = np.flatnonzero(is_tele & (ts != 0))
+    tele_max = first_per_group(groups[tele], n_groups, idx[tele], -ts[tele])
+    tele_min = first_per_group(groups[tele], n_groups, -idx[tele], ts[tele])
+
+    secs = rows["video_sec"]
+    all_matches = []
+    for g in range(n_groups):
+        p2em = Pass2EventMatch(cols.names[rows["name_id"][starts[g]]], None, None, cols.teams[red[g]],
+                               cols.teams[blue[g]], (None, False, True)[replay[g]], bool(tops[g]), bool(flipped[g]), display_id)
+
+        auto_max_time = auto_max_ts = tele_max_time = tele_max_ts = tele_min_time = tele_min_ts = None
+        if auto_max[g] >= 0:
+            i = auto[auto_max[g]]
+            auto_max_time, auto_max_ts = int(ts[i]), float(secs[i])
+        if tele_max[g] >= 0:
+            i, j = tele[tele_max[g]], tele[tele_min[g]]
+            tele_max_time, tele_max_ts = int(ts[i]), float(secs[i])
+            tele_min_time, tele_min_ts = int(ts[j]), float(secs[j])
+
+        p2em.start_ts, p2em.end_ts = match_times(auto_max_time, auto_max_ts, tele_max_time, tele_max_ts,
+                                                 tele_min_time, tele_min_ts)
+        all_matches.append(p2em)
+    return all_matches
+
+
+class GroupState:
+    """running aggregate of one match group, what combine_display computes from the group's entries"""
+    # attributes reduced to their most common value
+    MODE_ATTRS = ("red_teams", "blue_teams", "is_replay", "colors_flipped", "top")
+
+    def __init__(self, name, display_id=0):
+        self.name = name
+        self.display_id = display_id
+        # {attr: {value: count}}, dicts keep first-seen order for freq_max's tie breaking
+        self.freqs = {attr: {} for attr in self.MODE_ATTRS}
+        self.auto_max = None
+        self.tele_max = None
+        self.tele_min = None
+        self.last_sec = None
+        # emitted key and match, once emitted
+        self.key = None
+        self.emitted = None
+
+    def add(self, mtch: pass1.Pass1EventMatch):
+        for attr, tbl in self.freqs.items():
+            val = getattr(mtch, attr)
+            tbl[val] = tbl.get(val, 0) + 1
+        reading = (mtch.match_ts, mtch.video_sec)
+        if not mtch.is_tele:
             # do not match "30", this is prematch
-            if auto_match.match_ts >= 30:
-                continue
-            if auto_max_time is None:
-                auto_max_time, auto_max_ts = auto_match.match_ts, auto_match.video_sec
-            elif auto_match.match_ts > auto_max_time:
-                auto_max_time, auto_max_ts = auto_match.match_ts, auto_match.video_sec
-
-        # we may have only recognized the 8 second switchover
-        if auto_max_time is not None and auto_max_time <= 8:
-            auto_max_time = None
-        
-        tele_max_time, tele_max_ts = None, None
-        tele_min_time, tele_min_ts = None, None
-
-        for tele_match in (c for c in match_group if c.is_tele):
-            if tele_match.match_ts == 0:
-                continue
-
-            if tele_max_time is None:
-                tele_max_time, tele_max_ts = tele_match.match_ts, tele_match.video_sec
-
-            elif tele_match.match_ts > tele_max_time:
-                tele_max_time, tele_max_ts = tele_match.match_ts, tele_match.video_sec
-            
-            if tele_min_time is None:
-                tele_min_time, tele_min_ts = tele_match.match_ts, tele_match.video_sec
-            elif tele_min_time >= tele_match.match_ts:
-                tele_min_time, tele_min_ts = tele_match.match_ts, tele_match.video_sec
-            
-        # logic out the match start and end times
-        if auto_max_time is not None:
-            match_start = max(auto_max_ts - (30 - auto_max_time) - consts.MATCH_PRE_AUTO_START, 0)
-        elif tele_max_time is None:
-            raise RuntimeError("this hsould literally never ahppen bruh")
-        else:
-            match_start = max(tele_max_ts - (120 - tele_max_time) - (38) - consts.MATCH_PRE_AUTO_START, 0)
-        
-        if tele_min_time is not None:
-            match_end = tele_min_ts + tele_min_time + consts.MATCH_POST_TELE_END
+            if mtch.match_ts < 30 and (self.auto_max is None or mtch.match_ts > self.auto_max[0]):
+                self.auto_max = reading
+        elif mtch.match_ts != 0:
+            if self.tele_max is None or mtch.match_ts > self.tele_max[0]:
+                self.tele_max = reading
+            if self.tele_min is None or self.tele_min[0] >= mtch.match_ts:
+                self.tele_min = reading
+        self.last_sec = mtch.video_sec
+
+    def merge(self, other):
+        """adds the entries of other, a later group of the same name"""
+        for attr, tbl in self.freqs.items():
+            for val, n in other.freqs[attr].items():
+                tbl[val] = tbl.get(val, 0) + n
+        if other.auto_max is not None and (self.auto_max is None or other.auto_max[0] > self.auto_max[0]):
+            self.auto_max = other.auto_max
+        if other.tele_max is not None and (self.tele_max is None or other.tele_max[0] > self.tele_max[0]):
+            self.tele_max = other.tele_max
+        if other.tele_min is not None and (self.tele_min is None or self.tele_min[0] >= other.tele_min[0]):
+            self.tele_min = other.tele_min
+        self.last_sec = other.last_sec
+
+    def has_times(self):
+        return self.tele_max is not None or (self.auto_max is not None and self.auto_max[0] > 8)
+
+    def to_match(self):
+        p2em = Pass2EventMatch(self.name, None, None, None, None, None, None, None, self.display_id)
+        for attr, tbl in self.freqs.items():
+            setattr(p2em, attr, max(tbl, key=tbl.get))
+        p2em.start_ts, p2em.end_ts = match_times(*(self.auto_max or (None, None)), *(self.tele_max or (None, None)),
+                                                 *(self.tele_min or (None, None)))
+        return p2em
+
+
+@dataclasses.dataclass
+class Pass2Update:
+    """a match emitted by OnlineCombiner. key identifies the match, revised is set when this replaces
+    an earlier Pass2Update with the same key"""
+    key: int
+    match: Pass2EventMatch
+    revised: bool = False
+
+
+class OnlineCombiner:
+    """combine_matches for a stream of pass1 entries (e.g. pass1.iter_run), one entry at a time.
+
+    only each display's open group and current run of entries are kept, so memory doesn't grow with the stream.
+    a group is final once a run of another name reaches consts.MATCH_GROUP_MIN_COUNT entries (shorter runs are
+    dropped, and the group could continue after them). waiting for that can take until the next match, so a group
+    is also emitted once close_sec seconds of video go by without an entry for it; if more of it shows up later,
+    it's emitted again with revised=True. applying every update by key ends up at combine_matches' result
+    (sorted by start_ts across displays).
+
+    usage:
+        comb = OnlineCombiner()
+        updates = []
+        # progress lets groups time out while no match display is on screen
+        for mtch in pass1.iter_run(..., progress=lambda sec: updates.extend(comb.advance(sec))):
+            updates.extend(comb.add(mtch))
+            ...
+        updates.extend(comb.flush())
+    """
+    def __init__(self, close_sec=consts.PASS2_CLOSE_SEC):
+        self.close_sec = close_sec
+        # {display_id: [open group, current run name, run length, run's GroupState until it's long enough]}
+        self.displays = {}
+        self.next_key = 0
+
+    def _emit(self, group, out):
+        match = group.to_match()
+        if group.key is None:
+            group.key = self.next_key
+            self.next_key += 1
+            out.append(Pass2Update(group.key, match))
+        elif match != group.emitted:
+            out.append(Pass2Update(group.key, match, revised=True))
+        group.emitted = match
+
+    def add(self, mtch: pass1.Pass1EventMatch):
+        """takes the next entry, returns the list of Pass2Updates it causes"""
+        out = []
+        state = self.displays.setdefault(mtch.display_id, [None, None, 0, None])
+        group, run_name, run_len, run = state
+        if mtch.name != run_name:
+            run_name, run_len, run = mtch.name, 0, GroupState(mtch.name, mtch.display_id)
+        run_len += 1
+
+        if run is None:
+            # the run already made it into the group
+            group.add(mtch)
+            if group.key is not None:
+                self._emit(group, out)
         else:
-            match_end = auto_max_ts + auto_max_time + 128 + consts.MATCH_POST_TELE_END
+            run.add(mtch)
+            if run_len >= consts.MATCH_GROUP_MIN_COUNT:
+                if group is not None and group.name == run.name:
+                    group.merge(run)
+                    if group.key is not None:
+                        self._emit(group, out)
+                else:
+                    if group is not None and group.key is None:
+                        self._emit(group, out)
+                    group = run
+                run = None
+        state[:] = group, run_name, run_len, run
 
-        p2em.start_ts = match_start
-        p2em.end_ts = match_end
-        all_matches.append(p2em)
-    return all_matches
\ No newline at end of file
+        out.extend(self.advance(mtch.video_sec))
+        return out
+
+    def advance(self, sec):
+        """reports that the stream has been processed up to sec (even without entries).
+        emits the open groups that have gone close_sec without an entry"""
+        out = []
+        for group, _, _, _ in self.displays.values():
+            if (group is not None and group.key is None and sec - group.last_sec >= self.close_sec
+                    and group.has_times()):
+                self._emit(group, out)
+        return out
+
+    def flush(self):
+        """ends the stream, emitting every group that hasn't been yet"""
+        out = []
+        for group, _, _, _ in self.displays.values():
+            if group is not None and group.key is None:
+                self._emit(group, out)
+        self.displays = {}
+        return out
+
+
+def combine_stream(matches, close_sec=consts.PASS2_CLOSE_SEC):
+    """yields OnlineCombiner's Pass2Updates for an iterable of pass1 entries"""
+    comb = OnlineCombiner(close_sec)
+    for mtch in matches:
+        yield from comb.add(mtch)
+    yield from comb.flush()
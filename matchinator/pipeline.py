@@ -0,0 +1,173 @@
+"""
+threaded pass1 pipeline
+
+splits pass1's per-frame work into stages connected by bounded queues, so decoding the next frames, template
+matching and OCR all overlap instead of running back to back:
+
+    decode (1 thread) -> detect (1 thread) -> analyze (ocr_workers threads) -> consumer
+
+opencv, numpy, pyav and tesseract (through tesserocr, or the pytesseract subprocess) all drop the GIL for the
+heavy lifting, so this pays off without multiprocessing. the queues keep decode from running arbitrarily far ahead
+of OCR, so memory stays bounded by queue_size frames per stage.
+
+the frames to read are fixed up front (every poll seconds), since the adaptive scheduler needs each frame's
+detection before it can pick the next one.
+"""
+import sys
+import time
+import queue
+import threading
+import concurrent.futures
+import numpy as np
+
+# end of stream marker passed down the queues
+_DONE = object()
+
+
+class StageStats:
+    """per-stage counters. busy is the time spent doing work, not waiting on the queues"""
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.max_depth = 0
+        self._depth_total = 0
+        self._lock = threading.Lock()
+
+    def record(self, elapsed, depth=None):
+        with self._lock:
+            self.items += 1
+            self.busy += elapsed
+            if depth is not None:
+                self.max_depth = max(self.max_depth, depth)
+                self._depth_total += depth
+
+    @property
+    def mean_depth(self):
+        return self._depth_total / self.items if self.items else 0.0
+
+    @property
+    def throughput(self):
+        """items per busy second"""
+        return self.items / self.busy if self.busy else 0.0
+
+    def __str__(self):
+        return (f"{self.name:>8}: {self.items} items, {self.busy:.3f}s busy ({self.throughput:.1f}/s), "
+                f"out queue depth max {self.max_depth} mean {self.mean_depth:.1f}")
+
+
+class Pipeline:
+    """runs analyzer (a pass1.FrameAnalyzer) over reader.poll(poll, start_sec, end_sec) on worker threads.
+
+    iterating yields (frame, [Pass1EventMatch]) for every polled frame in frame order, one match per usable
+    display. exceptions raised on a worker thread are re-raised in the consumer.
+
+    ocr_workers: threads running analyzer.analyze (the OCR)
+    queue_size: max items waiting between each pair of stages
+    """
+    def __init__(self, reader, analyzer, poll=1, start_sec=0, end_sec=None, ocr_workers=2, queue_size=8):
+        self.reader = reader
+        self.analyzer = analyzer
+        self.poll = poll
+        self.start_sec = start_sec
+        self.end_sec = end_sec
+        self.ocr_workers = max(ocr_workers, 1)
+        self.queue_size = queue_size
+        self.stats = {name: StageStats(name) for name in ("decode", "detect", "analyze")}
+
+        self._frames = queue.Queue(queue_size)
+        self._detections = queue.Queue(queue_size)
+        self._stop = threading.Event()
+        self._error = None
+        # the last Detection found, for debugging
+        self.last_detection = None
+
+    def _put(self, q, item):
+        """put that gives up once the pipeline is stopped, so workers never hang on a full queue"""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, q):
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return _DONE
+
+    def _fail(self, e):
+        if self._error is None:
+            self._error = e
+        self._stop.set()
+
+    def _decode(self):
+        stats = self.stats["decode"]
+        copy = self.reader.reuses_buffers
+        try:
+            frames = self.reader.poll(self.poll, self.start_sec, self.end_sec)
+            while True:
+                start = time.perf_counter()
+                vframe = next(frames, None)
+                if vframe is None:
+                    break
+                if copy:
+                    # the reader will overwrite this buffer while later stages still hold it
+                    vframe = type(vframe)(vframe.idx, vframe.sec, np.copy(vframe.image))
+                stats.record(time.perf_counter() - start, self._frames.qsize())
+                if not self._put(self._frames, vframe):
+                    return
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._put(self._frames, _DONE)
+
+    def _detect(self, pool):
+        stats = self.stats["detect"]
+        try:
+            while (vframe := self._get(self._frames)) is not _DONE:
+                start = time.perf_counter()
+                dets = self.analyzer.detect(vframe.image)
+                if dets:
+                    self.last_detection = dets[-1]
+                futs = [pool.submit(self._analyze, vframe, det) for det in dets if det.needs_ocr]
+                stats.record(time.perf_counter() - start, self._detections.qsize())
+                if not self._put(self._detections, (vframe, futs)):
+                    return
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._put(self._detections, _DONE)
+
+    def _analyze(self, vframe, det):
+        start = time.perf_counter()
+        match = self.analyzer.analyze(vframe, det)
+        self.stats["analyze"].record(time.perf_counter() - start)
+        return match
+
+    def __iter__(self):
+        pool = concurrent.futures.ThreadPoolExecutor(self.ocr_workers, thread_name_prefix="pass1-ocr")
+        threads = [threading.Thread(target=self._decode, name="pass1-decode", daemon=True),
+                   threading.Thread(target=self._detect, args=(pool,), name="pass1-detect", daemon=True)]
+        for th in threads:
+            th.start()
+        try:
+            # futures were queued in frame order, so waiting on them in turn keeps the output ordered
+            while (item := self._get(self._detections)) is not _DONE:
+                vframe, futs = item
+                yield vframe, [m for m in (fut.result() for fut in futs) if m is not None]
+            if self._error is not None:
+                raise self._error
+        finally:
+            self._stop.set()
+            for th in threads:
+                th.join()
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def print_stats(self, pout=sys.stderr):
+        for stats in self.stats.values():
+            print(stats, file=pout)
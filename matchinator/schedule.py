@@ -0,0 +1,206 @@
+"""
+poll scheduling for pass1
+
+implements the browse/display_detect states from the autoclipping algo in the design doc:
+scan coarsely while there's no match display on screen, poll densely while there is.
+"""
+import math
+from . import consts
+
+
+class PollScheduler:
+    """decides which video times pass1 looks at.
+
+    browse: no match display seen lately. the poll period backs off geometrically from poll up to browse_poll.
+    display: a display was seen in the last linger seconds, poll every poll seconds.
+    skip (with skip_ahead): the match clock has been locked onto (see observe()), so only sparse samples
+        every consts.SKIP_VERIFY_POLL seconds check the match is still on schedule until shortly before
+        teleop ends, when display polling resumes. pass2 only needs the start of auto and the end of teleop.
+        a sample that doesn't fit the prediction (abort, field fault, replay) drops back to display polling.
+
+    when browse finds a display, or a skip sample doesn't check out, the gap since the previous good sample
+    is backfilled at the dense rate (if the reader can rewind), so nothing is skipped.
+    browse_poll is capped at consts.MATCH_MIN_DISPLAY_SEC so a whole match can never fall between two samples,
+    and the last sample before end_sec is taken on the dense grid right before it.
+
+    usage:
+        while (t := sched.next_time()) is not None:
+            frame = reader.read_at(t)
+            ...
+            sched.update(t, frame.sec, has_display)
+            # for each timer read off the frame, with skip_ahead
+            sched.observe(t, frame.sec, name, is_tele, match_ts)
+    """
+    BROWSE = "browse"
+    DISPLAY = "display"
+    SKIP = "skip"
+
+    def __init__(self, poll=1, browse_poll=None, linger=consts.BROWSE_LINGER, start_sec=0, end_sec=None, rewind=True,
+                 skip_ahead=False):
+        self.poll = poll
+        self.browse_poll = min(max(browse_poll or poll, poll), consts.MATCH_MIN_DISPLAY_SEC)
+        self.linger = linger
+        self.end_sec = end_sec
+        self.rewind = rewind
+        self.skip_ahead = skip_ahead
+
+        self.state = self.BROWSE
+        self.period = self.browse_poll
+        self.last_seen = None
+        self.backfill = []
+        self._next = start_sec
+        # time of the last browse/display sample (not counting backfill)
+        self._prev = None
+        # everything before this time has been looked at. a sample at t settles up to t + poll, the next time
+        # on the dense grid, so resuming from settled never reads t again
+        self.settled = start_sec
+
+        # skip-ahead: (match name, predicted end of teleop) while skipping
+        self.lock = None
+        # recent (name, possible teleop ends) readings, and the last sample time that agreed with the lock
+        self._readings = []
+        self._verified = None
+        # the next sample is where display polling resumes
+        self._resuming = False
+        self.skip_stats = {"locks": 0, "fallbacks": 0}
+
+    def next_time(self):
+        """the next video time to look at, or None once past end_sec"""
+        if self.backfill:
+            return self.backfill[0]
+        if self.end_sec is not None and self._next >= self.end_sec:
+            return None
+        return self._next
+
+    def _advance(self, t, frame_sec, period):
+        nxt = t + period
+        # skip over gaps in vfr footage instead of bursting through consecutive frames
+        while nxt <= frame_sec:
+            nxt += period
+        if self.end_sec is not None and nxt >= self.end_sec > t + self.poll:
+            # don't step over the end: one last sample on the dense grid right before it, which backfills if
+            # it finds a display, so a display at the very end of the range isn't missed
+            nxt = t + self.poll * math.ceil((self.end_sec - t) / self.poll - 1)
+        self._next = nxt
+
+    def _backfill_since(self, since, t):
+        """queues dense samples for the gap between since and t"""
+        if self.rewind and since is not None and t - since > self.poll:
+            n = int(round((t - since) / self.poll))
+            self.backfill = [since + self.poll * i for i in range(1, n)]
+
+    def update(self, t, frame_sec, has_display):
+        """reports what the frame read for next_time() t (actually at frame_sec) showed"""
+        if self.backfill:
+            self.backfill.pop(0)
+            if not self.backfill:
+                self.settled = self._prev + self.poll
+            return
+
+        if self.state == self.SKIP and self._resuming:
+            # the last sparse sample went unchecked, carry on densely
+            self._end_skip()
+
+        if self.state == self.SKIP:
+            if has_display:
+                self.last_seen = frame_sec
+                self._advance_skip(t, frame_sec)
+            else:
+                self._fallback(t, frame_sec)
+            # only settled once observe() has checked the sample
+            self._prev = t
+            return
+
+        if has_display:
+            if self.state == self.BROWSE:
+                self.state = self.DISPLAY
+                # the display could have come up anywhere since the last browse sample
+                self._backfill_since(self._prev, t)
+            self.last_seen = frame_sec
+            self._advance(t, frame_sec, self.poll)
+        elif self.state == self.DISPLAY and frame_sec - self.last_seen >= self.linger:
+            # display's been gone for a while, back to browsing. start off dense and back off
+            self.state = self.BROWSE
+            self.period = min(self.poll * 2, self.browse_poll)
+            self._advance(t, frame_sec, self.period)
+        elif self.state == self.DISPLAY:
+            self._advance(t, frame_sec, self.poll)
+        else:
+            self._advance(t, frame_sec, self.period)
+            self.period = min(self.period * 2, self.browse_poll)
+
+        if not self.backfill:
+            self.settled = t + self.poll
+        self._prev = t
+
+    @staticmethod
+    def tele_ends(sec, is_tele, match_ts):
+        """the video times teleop could end at, given the timer read at sec"""
+        if is_tele:
+            return (sec + match_ts,)
+        ends = (sec + match_ts + consts.MATCH_SWITCHOVER_SEC + consts.MATCH_TELE_SEC,)
+        if match_ts <= consts.MATCH_SWITCHOVER_SEC:
+            # could be the end of auto or the switchover countdown
+            ends += (sec + match_ts + consts.MATCH_TELE_SEC,)
+        return ends
+
+    def observe(self, t, frame_sec, name, is_tele, match_ts):
+        """reports a match timer read off the frame for t. only does anything with skip_ahead"""
+        if not self.skip_ahead or self.backfill or match_ts == 0 or t != self._prev:
+            return
+        ends = self.tele_ends(frame_sec, is_tele, match_ts)
+
+        if self.state == self.SKIP:
+            if name == self.lock[0] and any(abs(end - self.lock[1]) <= consts.SKIP_TOLERANCE for end in ends):
+                self._verified = t
+                self.settled = t + self.poll
+                if self._resuming:
+                    self._end_skip()
+            else:
+                self._fallback(t, frame_sec)
+            return
+
+        if self.state != self.DISPLAY:
+            return
+        self._readings = (self._readings + [(name, ends)])[-consts.SKIP_LOCK_READINGS:]
+        if len(self._readings) < consts.SKIP_LOCK_READINGS or any(n != name for n, _ in self._readings):
+            return
+        # a teleop end every recent reading agrees on
+        for end in ends:
+            if all(any(abs(end - e) <= consts.SKIP_TOLERANCE for e in es) for _, es in self._readings):
+                break
+        else:
+            return
+        if end - consts.SKIP_TELE_END_LEAD <= t + consts.SKIP_VERIFY_POLL:
+            # nearly over anyway
+            return
+
+        self.state = self.SKIP
+        self.lock = (name, end)
+        self._verified = t
+        self._readings = []
+        self.skip_stats["locks"] += 1
+        self._advance_skip(t, frame_sec)
+
+    def _advance_skip(self, t, frame_sec):
+        resume = self.lock[1] - consts.SKIP_TELE_END_LEAD
+        self._advance(t, frame_sec, consts.SKIP_VERIFY_POLL)
+        if self._next >= resume:
+            # close to the end of teleop, poll densely from here on
+            self._next = max(resume, t + self.poll)
+            self._resuming = True
+
+    def _end_skip(self):
+        self.state = self.DISPLAY
+        self.lock = None
+        self._resuming = False
+
+    def _fallback(self, t, frame_sec):
+        """the match didn't go as predicted. poll densely again, backfilling from the last sample that checked out"""
+        self.skip_stats["fallbacks"] += 1
+        self._end_skip()
+        self._readings = []
+        self._advance(t, frame_sec, self.poll)
+        self._backfill_since(self._verified, t)
+        if not self.backfill:
+            self.settled = t + self.poll
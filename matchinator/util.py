@@ -1,7 +1,5 @@
-import numpy as np
-import cv2
-import pytesseract
-from . import consts
+import dataclasses
+from . import consts, ocr
 from .matchers import BlobMatcher
 
 class DictStruct:
@@ -47,7 +45,7 @@ def crop_rect(img, xrange, yrange):
     
 
 def get_match_display(frame, match_tlbr, params: consts.ScaledParams):
-    """crops the lower match display from the frame"""
+    """crops the lower match display from the frame. a FrameContext frame gives a FrameContext crop"""
     tl, br = match_tlbr
     height = params.DISPLAY_HEIGHT
     if tl[1] < frame.shape[0] / 2:
@@ -58,52 +56,163 @@ def get_match_display(frame, match_tlbr, params: consts.ScaledParams):
 def match_is_preview(match_display):
     # this looks at the match display and checks if it's currently mostly red and blue
     # if so, then we're looking at a match preview
-    blob_size = (np.count_nonzero(BlobMatcher.threshold(match_display, "blue"))
-                + np.count_nonzero(BlobMatcher.threshold(match_display, "red")))
+    fractions = BlobMatcher.fractions(match_display, ("blue", "red"), step=consts.COLOR_SAMPLE_STEP)
 
-    return blob_size / (match_display.shape[0] * match_display.shape[1]) >= consts.MATCH_PREVIEW_THR
+    return fractions["blue"] + fractions["red"] >= consts.MATCH_PREVIEW_THR
 
-def extract_text(img, pyts_config=None):
-    """Extracts text from BGR image."""
-    if not pyts_config:
-        pyts_config = {}
-    return pytesseract.image_to_string(cv2.cvtColor(img, cv2.COLOR_BGR2RGB), **pyts_config)
+def extract_text(img, psm=3, kind=None):
+    """Extracts text from BGR image with the current ocr.backend.
+    psm: tesseract page segmentation mode
+    kind: ROI kind ("name", "timer", ...). if given, results are cached in ocr.cache under that namespace
+    """
+    read = lambda im: ocr.backend.read(im, psm=psm)
+    if kind is None:
+        return read(img)
+    return ocr.cache.get(kind, img, read, extra=f"psm {psm}")
 
-def extract_match_name(frame, match_tlbr, params: consts.ScaledParams):
-    """returns (text, image used)"""
+def crop_match_name(frame, match_tlbr, params: consts.ScaledParams):
     tl, br = match_tlbr
 
     #name_frame = frame[tl[1]:tl[1] + params.MATCH_NAME_HEIGHT, 
     #            tl[0] + params.MATCH_NAME_LEFT_OFFSET:tl[0] + params.MATCH_NAME_LEFT_OFFSET + params.MATCH_NAME_WIDTH, :]
-    name_frame = crop_rect(frame, (tl[0] + params.NAME_LEFT_OFFSET, params.NAME_WIDTH), (tl[1], params.NAME_HEIGHT))
-    
-    return extract_text(name_frame, {"config": "--psm 6"}).strip(), name_frame
-
-def extract_match_time(match_display, is_top, params: consts.ScaledParams):
+    return crop_rect(frame, (tl[0] + params.NAME_LEFT_OFFSET, params.NAME_WIDTH), (tl[1], params.NAME_HEIGHT))
 
+def crop_match_time(match_display, is_top, params: consts.ScaledParams):
     if is_top:
         time_top = params.TIMER_EDGE_OFFSET
         time_bottom = time_top + params.TIMER_HEIGHT
     else:
         time_top = match_display.shape[0] - params.TIMER_EDGE_OFFSET - params.TIMER_HEIGHT
         time_bottom = match_display.shape[0] - params.TIMER_EDGE_OFFSET
-    match_time = match_display[time_top:time_bottom, params.TIMER_LEFT_OFFSET:params.TIMER_LEFT_OFFSET + params.TIMER_WIDTH, :]
-
-    # use the traditional matcher, since we only want to allow digits and it may work better 
-    return extract_text(match_time, {"config": "--psm 6"}).strip(), match_time
+    return match_display[time_top:time_bottom, params.TIMER_LEFT_OFFSET:params.TIMER_LEFT_OFFSET + params.TIMER_WIDTH, :]
 
-def extract_match_teams(match_display, params: consts.ScaledParams):
+def crop_match_teams(match_display, params: consts.ScaledParams):
+    """returns (left alliance crop, right alliance crop)"""
     #left_display = match_display[:, params.MATCH_LEFT_ALLIANCE_OFFSET:params.MATCH_LEFT_ALLIANCE_OFFSET+params.MA]
     left_display = crop_rect(match_display, (params.LEFT_ALLIANCE_OFFSET, params.ALLIANCE_WIDTH), None)
     right_display = crop_rect(match_display, (params.RIGHT_ALLIANCE_OFFSET, params.ALLIANCE_WIDTH), None)
+    return left_display, right_display
 
-    left_teams = extract_text(left_display).strip().split()
-    right_teams = extract_text(right_display).strip().split()
+def read_unchanged(changes, slot, img, compute):
+    """compute(img), or the slot's last value if changes (an ocr.ChangeDetector) says img hasn't changed"""
+    if changes is None:
+        return compute(img)
+    return changes.get(slot, img, compute)
+
+def extract_match_name(frame, match_tlbr, params: consts.ScaledParams, changes=None, display_id=0):
+    """returns (text, image used)
+    changes: optional ocr.ChangeDetector, the name is only read again once its crop changes
+    """
+    name_frame = crop_match_name(frame, match_tlbr, params)
+    
+    text = read_unchanged(changes, ("name", display_id), name_frame, lambda im: extract_text(im, psm=6, kind="name"))
+    return text.strip(), name_frame
+
+def read_digits(img, digits):
+    """reads img with a digits.DigitRecognizer. returns the text, or None if there's no recognizer
+    or it isn't confident enough (callers fall back to OCR)"""
+    if digits is None:
+        return None
+    text, confidence = digits.read(img)
+    if not text or confidence < consts.DIGIT_MIN_CONFIDENCE:
+        return None
+    return text
+
+def extract_match_time(match_display, is_top, params: consts.ScaledParams, digits=None):
+    """digits: optional digits.DigitRecognizer tried before OCR"""
+    match_time = crop_match_time(match_display, is_top, params)
+
+    text = read_digits(match_time, digits)
+    if text is not None:
+        return text, match_time
+    # use the traditional matcher, since we only want to allow digits and it may work better 
+    return extract_text(match_time, psm=6, kind="timer").strip(), match_time
+
+def extract_match_teams(match_display, params: consts.ScaledParams, digits=None, changes=None, display_id=0):
+    """digits: optional digits.DigitRecognizer tried before OCR
+    changes: optional ocr.ChangeDetector, each team list is only read again once its crop changes
+    """
+    left_display, right_display = crop_match_teams(match_display, params)
+
+    def read(display):
+        text = read_digits(display, digits)
+        if text is None:
+            text = extract_text(display, kind="teams")
+        return text
+
+    teams = []
+    for side, display in (("left", left_display), ("right", right_display)):
+        text = read_unchanged(changes, ("teams", display_id, side), display, read)
+        teams.append(text.strip().split())
+    left_teams, right_teams = teams
 
 
     return left_teams, right_teams
 
+@dataclasses.dataclass
+class FieldReads:
+    """one display's name, timer and team crops part way through extract_match_fields.
+    texts holds what's known without tesseract, todo the fields still to OCR"""
+    fields: list
+    slots: list
+    texts: list
+    smalls: list
+
+    @property
+    def todo(self):
+        return [i for i, text in enumerate(self.texts) if text is None]
+
+def prepare_match_fields(frame, match_tlbr, match_display, is_top, params: consts.ScaledParams, digits=None,
+                         changes=None, display_id=0):
+    """crops the fields and fills in whatever doesn't need tesseract: unchanged name/teams from changes and
+    confident digit reads. OCR the (kind, crop) fields of reads.todo, then pass the texts to finish_match_fields"""
+    left_display, right_display = crop_match_teams(match_display, params)
+    fields = [
+        ("name", crop_match_name(frame, match_tlbr, params)),
+        ("timer", crop_match_time(match_display, is_top, params)),
+        ("teams", left_display),
+        ("teams", right_display),
+    ]
+    # the timer changes every second, it's always read
+    slots = [("name", display_id), None, ("teams", display_id, "left"), ("teams", display_id, "right")]
+    texts = [None] * len(fields)
+    smalls = [None] * len(fields)
+    for i, (slot, (_, crop)) in enumerate(zip(slots, fields)):
+        if changes is not None and slot is not None:
+            texts[i], smalls[i] = changes.lookup(slot, crop)
+        if texts[i] is None and i > 0:
+            texts[i] = read_digits(crop, digits)
+            if texts[i] is not None and slot is not None and changes is not None:
+                changes.store(slot, smalls[i], texts[i])
+    return FieldReads(fields, slots, texts, smalls)
+
+def finish_match_fields(reads: FieldReads, texts, changes=None, carried=()):
+    """fills in the OCRed texts of reads.todo (in order) and remembers them in changes.
+    carried: fields of todo whose text was taken from an unchanged crop of the same slot instead of read
+    returns (name, timer text, left teams, right teams)"""
+    for i, text in zip(reads.todo, texts):
+        reads.texts[i] = text
+        if changes is not None and reads.slots[i] is not None:
+            if i in carried:
+                changes.carry(reads.slots[i])
+            else:
+                changes.store(reads.slots[i], reads.smalls[i], text)
+
+    name, timer, left, right = reads.texts
+    return name.strip(), timer.strip(), left.split(), right.split()
+
+def extract_match_fields(frame, match_tlbr, match_display, is_top, params: consts.ScaledParams, digits=None,
+                         changes=None, display_id=0):
+    """reads the match name, timer and both team lists with a single tesseract call (see ocr.read_batch).
+    with a digits.DigitRecognizer, the timer and teams only go to tesseract if it isn't confident.
+    with an ocr.ChangeDetector, the name and teams are only read again once their crops change.
+    returns (name, timer text, left teams, right teams)
+    """
+    reads = prepare_match_fields(frame, match_tlbr, match_display, is_top, params, digits=digits, changes=changes,
+                                 display_id=display_id)
+    return finish_match_fields(reads, ocr.read_batch([reads.fields[i] for i in reads.todo]), changes)
+
 def are_colors_flipped(match_display, params: consts.ScaledParams):
-    sthresh = BlobMatcher.threshold(crop_rect(match_display, (params.LEFT_TOTAL_SCORE_OFFSET, params.LEFT_TOTAL_SCORE_WIDTH), (0, params.LEFT_TOTAL_SCORE_HEIGHT)), "blue")
+    score_box = crop_rect(match_display, (params.LEFT_TOTAL_SCORE_OFFSET, params.LEFT_TOTAL_SCORE_WIDTH), (0, params.LEFT_TOTAL_SCORE_HEIGHT))
 
-    return np.count_nonzero(sthresh) / (sthresh.shape[0] * sthresh.shape[1]) < consts.MATCH_PREVIEW_THR
+    return BlobMatcher.fractions(score_box, ("blue",), step=consts.COLOR_SAMPLE_STEP)["blue"] < consts.MATCH_PREVIEW_THR
@@ -0,0 +1,437 @@
+"""
+video readers for pass1
+
+all readers hand back Frame objects at requested video times, only fully decoding the frames that are asked for.
+OpenCVReader is the classic cv2.VideoCapture path, PyAVReader uses pyav for keyframe seeking, threaded decoding
+and pts based timestamps (which don't drift on vfr footage like NorCal's). FFmpegPipeReader leaves sampling,
+scaling and color conversion to an ffmpeg subprocess.
+"""
+import os
+import math
+import time
+import json
+import subprocess
+import dataclasses
+import numpy as np
+import cv2
+
+
+@dataclasses.dataclass
+class Frame:
+    idx: int  # frame index. estimated from the timestamp for readers that can't count frames after a seek
+    sec: float  # presentation time in seconds from the start of the video
+    image: np.ndarray  # BGR image (or grayscale, if the reader was asked for it). may be a reused buffer
+
+
+class VideoReader:
+    """base class for video readers.
+
+    subclasses set fps, width, height, frame_count and duration, and implement read_at/seek/close.
+    """
+    fps: float
+    width: int
+    height: int
+    frame_count: int
+    duration: float
+    # whether read_at can go back to before the last frame it returned
+    can_rewind = True
+    # whether a returned image can be overwritten by later reads
+    reuses_buffers = False
+
+    def read_at(self, sec):
+        """returns the first Frame at or after sec (within half a frame), or None at the end of the video.
+        asking for a time before the last returned frame seeks back (if can_rewind), otherwise the next
+        frame is returned.
+        """
+        raise NotImplementedError
+
+    def seek(self, sec):
+        """repositions the reader so the next read_at(sec) doesn't have to decode everything before it."""
+        raise NotImplementedError
+
+    def set_period(self, period):
+        """tells the reader reads will be period seconds (or a multiple) apart. only readers that sample before
+        decoding (FFmpegPipeReader) need to know"""
+        pass
+
+    def close(self):
+        pass
+
+    def poll(self, poll=1, start_sec=0, end_sec=None):
+        """yields a Frame every poll seconds from start_sec up to (not including) end_sec"""
+        if start_sec > 0:
+            self.seek(start_sec)
+        t = start_sec
+        while end_sec is None or t < end_sec:
+            frame = self.read_at(t)
+            if frame is None or (end_sec is not None and frame.sec >= end_sec):
+                return
+            yield frame
+            # skip over gaps in vfr footage instead of bursting through consecutive frames
+            t = max(t + poll, start_sec + (math.floor((frame.sec - start_sec) / poll) + 1) * poll)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class OpenCVReader(VideoReader):
+    """cv2.VideoCapture reader. timestamps come from frame indexes, so they drift on vfr footage.
+
+    read_mode controls how frames between reads are skipped:
+     "read": fully decode every frame (the old pass1 behavior)
+     "grab": demux/decode frames between reads but never retrieve (convert + copy) them
+     "seek": like grab, but gaps longer than seek_threshold seconds are skipped with a seek. a seek decodes again
+        from the keyframe before its target, so it only pays off for gaps much longer than the GOP (2-4s in
+        most streams), e.g. browse polling
+    """
+    READ_MODES = ("read", "grab", "seek")
+
+    def __init__(self, video_path, read_mode="grab", seek_threshold=5):
+        if read_mode not in self.READ_MODES:
+            raise ValueError(f"unknown read mode {read_mode!r}")
+        self.video_path = video_path
+        self.read_mode = read_mode
+        self.seek_threshold = seek_threshold
+        self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            raise RuntimeError("could not open video")
+
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.duration = self.frame_count / self.fps if self.fps > 0 else 0
+        # index of the next frame cap will return
+        self.pos = 0
+
+    def _set_pos(self, idx):
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+        self.pos = idx
+
+    def _grab(self):
+        succ = self.cap.grab()
+        if succ:
+            self.pos += 1
+        return succ
+
+    def seek(self, sec):
+        self._set_pos(max(int(math.ceil(sec * self.fps - 0.5)), 0))
+
+    def read_at(self, sec):
+        target = max(int(math.ceil(sec * self.fps - 0.5)), 0)
+        if target < self.pos - 1:
+            self._set_pos(target)
+        target = max(target, self.pos)
+        if self.read_mode == "seek" and target - self.pos > self.seek_threshold * self.fps:
+            self._set_pos(target)
+        while self.pos < target:
+            if self.read_mode == "read":
+                succ, _ = self.cap.read()
+                if not succ:
+                    return None
+                self.pos += 1
+            elif not self._grab():
+                return None
+
+        if not self._grab():
+            return None
+        succ, image = self.cap.retrieve()
+        if not succ:
+            return None
+        return Frame(self.pos - 1, self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000, image)
+
+    def close(self):
+        self.cap.release()
+
+
+class TailFile:
+    """read-only file object over a file that's still being written, like a live .ts recording.
+
+    reads pick up where the last one left off and block until more data is appended, so the file is never
+    reopened or rescanned. EOF is reported once end_marker (a path) exists and everything before it was read,
+    or when nothing has been appended for idle_timeout seconds.
+    """
+    def __init__(self, path, idle_timeout=60, end_marker=None, poll_interval=0.5):
+        self.path = path
+        self.idle_timeout = idle_timeout
+        self.end_marker = end_marker
+        self.poll_interval = poll_interval
+        self.f = open(path, "rb", buffering=0)
+        # bytes read so far
+        self.offset = 0
+        self._last_data = time.time()
+
+    def _ended(self):
+        return self.end_marker is not None and os.path.exists(self.end_marker)
+
+    def read(self, n=-1):
+        while True:
+            # check for the marker before reading so data written right before it isn't lost
+            ended = self._ended()
+            data = self.f.read(n if n >= 0 else None)
+            if data:
+                self.offset += len(data)
+                self._last_data = time.time()
+                return data
+            if ended or time.time() - self._last_data > self.idle_timeout:
+                return b""
+            time.sleep(self.poll_interval)
+
+    def close(self):
+        self.f.close()
+
+
+class PyAVReader(VideoReader):
+    """pyav reader. timestamps are frame.pts * time_base, so they stay correct on vfr footage.
+
+    decode_threads: number of decoder threads (0 lets ffmpeg pick)
+    thread_type: "SLICE", "FRAME" or "AUTO"
+    seek_threshold: gaps longer than this many seconds are skipped with a keyframe seek instead of decoding through
+    follow: read a growing recording through a TailFile instead of stopping at the current end of the file.
+        seeking is disabled, duration and frame_count are 0. idle_timeout and end_marker are passed to the TailFile
+    format: container format, only needed in follow mode (defaults to mpegts there)
+    """
+    def __init__(self, video_path, decode_threads=0, thread_type="AUTO", seek_threshold=5,
+                 follow=False, idle_timeout=60, end_marker=None, format=None):
+        import av
+
+        self.video_path = video_path
+        self.seek_threshold = seek_threshold
+        self.follow = follow
+        self.tail = None
+        if follow:
+            self.tail = TailFile(video_path, idle_timeout=idle_timeout, end_marker=end_marker)
+            self.container = av.open(self.tail, format=format or "mpegts")
+            self.seek_threshold = math.inf
+            self.can_rewind = False
+        else:
+            self.container = av.open(video_path, format=format)
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = thread_type
+        self.stream.codec_context.thread_count = decode_threads
+
+        self.time_base = self.stream.time_base
+        self.start_pts = self.stream.start_time or 0
+        rate = self.stream.average_rate or self.stream.guessed_rate
+        self.fps = float(rate) if rate else 0
+        self.width = self.stream.codec_context.width
+        self.height = self.stream.codec_context.height
+        if follow:
+            self.duration = 0
+        elif self.stream.duration:
+            self.duration = float(self.stream.duration * self.time_base)
+        elif self.container.duration:
+            self.duration = self.container.duration / av.time_base
+        else:
+            self.duration = 0
+        self.frame_count = self.stream.frames or int(self.duration * self.fps)
+
+        self._frames = None
+        # time of the last frame handed out, or where we last seeked to
+        self._sec = 0
+
+    def _frame_sec(self, frame):
+        return float((frame.pts - self.start_pts) * self.time_base)
+
+    def seek(self, sec):
+        if self.follow:
+            # can't seek a live recording, read_at just decodes forward
+            return
+        # lands on the keyframe at or before sec, read_at decodes forward from there
+        self.container.seek(int(sec / self.time_base) + self.start_pts, stream=self.stream, backward=True, any_frame=False)
+        self._frames = None
+        self._sec = sec
+
+    def read_at(self, sec):
+        half_frame = 0.5 / self.fps if self.fps > 0 else 0
+        if sec - self._sec > self.seek_threshold or (self.can_rewind and sec < self._sec - half_frame):
+            self.seek(sec)
+        if self._frames is None:
+            self._frames = self.container.decode(self.stream)
+
+        for frame in self._frames:
+            if frame.pts is None:
+                continue
+            fsec = self._frame_sec(frame)
+            if fsec >= sec - half_frame:
+                self._sec = fsec
+                return Frame(int(round(fsec * self.fps)), fsec, frame.to_ndarray(format="bgr24"))
+        return None
+
+    def keyframes(self, start_sec=0):
+        """yields a Frame for every keyframe from start_sec on. everything in between is demuxed but never decoded,
+        which is many times cheaper than a full decode (see index.py)"""
+        self.seek(start_sec)
+        ctx = self.stream.codec_context
+        ctx.skip_frame = "NONKEY"
+        try:
+            for packet in self.container.demux(self.stream):
+                # the empty packet at the end flushes frames still in the decoder
+                if not packet.is_keyframe and packet.size:
+                    continue
+                for frame in packet.decode():
+                    if frame.pts is None:
+                        continue
+                    fsec = self._frame_sec(frame)
+                    self._sec = fsec
+                    yield Frame(int(round(fsec * self.fps)), fsec, frame.to_ndarray(format="bgr24"))
+        finally:
+            ctx.skip_frame = "DEFAULT"
+            self._frames = None
+
+    def close(self):
+        self.container.close()
+        if self.tail is not None:
+            self.tail.close()
+
+
+class FFmpegPipeReader(VideoReader):
+    """spawns ffmpeg and streams raw frames out of a pipe.
+
+    ffmpeg does the sampling (fps filter), cropping, scaling and pixel format conversion in its own process,
+    so python only ever sees the pixels it asked for. frames are read into a small ring of preallocated buffers,
+    so an image is only valid until n_buffers more frames have been read; copy it if you need to keep it.
+
+    width/height are the *output* size. frame times are on ffmpeg's fps grid (start + k * period).
+
+    period: seconds between output frames, so read_at can't return frames in between. poll() switches this to its
+        own poll interval, pass1 sets it to its poll with set_period()
+    crop: (x, y, w, h) in source pixels, applied before scaling
+    scale: (w, h) output size
+    pix_fmt: "bgr24" or "gray"
+    pass1 only takes scale: its offsets assume the whole frame and its checks need color, so it rejects
+    readers with crop or a gray pix_fmt.
+    seek_threshold: gaps longer than this many seconds restart ffmpeg with a fast input seek
+    """
+    PIX_FMT_CHANNELS = {"bgr24": 3, "gray": 1}
+    reuses_buffers = True
+
+    def __init__(self, video_path, period=1, crop=None, scale=None, pix_fmt="bgr24", n_buffers=4, threads=0,
+                 seek_threshold=30, ffmpeg="ffmpeg", ffprobe="ffprobe"):
+        if pix_fmt not in self.PIX_FMT_CHANNELS:
+            raise ValueError(f"unsupported pix_fmt {pix_fmt!r}")
+        self.video_path = video_path
+        self.period = period
+        self.crop = crop
+        self.scale = scale
+        self.pix_fmt = pix_fmt
+        self.threads = threads
+        self.seek_threshold = seek_threshold
+        self.ffmpeg = ffmpeg
+
+        probe = json.loads(subprocess.run(
+            [ffprobe, "-v", "error", "-select_streams", "v:0", "-show_streams", "-show_format", "-of", "json", video_path],
+            check=True, capture_output=True).stdout)
+        if not probe.get("streams"):
+            raise RuntimeError("could not open video")
+        vstream = probe["streams"][0]
+        num, den = vstream.get("avg_frame_rate", "0/1").split("/")
+        self.fps = float(num) / float(den) if float(den) else 0
+        self.src_width = int(vstream["width"])
+        self.src_height = int(vstream["height"])
+        self.duration = float(vstream.get("duration") or probe.get("format", {}).get("duration") or 0)
+        self.frame_count = int(vstream.get("nb_frames") or self.duration * self.fps)
+
+        self.width, self.height = self.src_width, self.src_height
+        if crop is not None:
+            self.width, self.height = crop[2], crop[3]
+        if scale is not None:
+            self.width, self.height = scale
+
+        shape = (self.height, self.width, 3) if self.PIX_FMT_CHANNELS[pix_fmt] == 3 else (self.height, self.width)
+        self._buffers = [np.empty(shape, dtype=np.uint8) for _ in range(n_buffers)]
+        self.proc = None
+        # time of output frame 0 and the number of frames read since
+        self._t0 = 0
+        self._k = 0
+
+    def _filters(self):
+        # round=up makes output frame k the input frame at (or just before) k * period instead of half a period later
+        filters = [f"fps=fps={1 / self.period}:round=up"]
+        if self.crop is not None:
+            x, y, w, h = self.crop
+            filters.append(f"crop={w}:{h}:{x}:{y}")
+        if self.scale is not None:
+            filters.append(f"scale={self.scale[0]}:{self.scale[1]}")
+        filters.append(f"format={self.pix_fmt}")
+        return ",".join(filters)
+
+    def _start(self, sec):
+        self._stop()
+        self._t0 = sec
+        self._k = 0
+        cmd = [self.ffmpeg, "-nostdin", "-loglevel", "error", "-threads", str(self.threads)]
+        if sec > 0:
+            cmd += ["-ss", f"{sec:.6f}"]
+        cmd += ["-i", self.video_path, "-an", "-sn", "-vf", self._filters(),
+                "-f", "rawvideo", "-pix_fmt", self.pix_fmt, "pipe:1"]
+        # stderr is dropped: ffmpeg complains about the broken pipe whenever we stop it early
+        self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=self._buffers[0].nbytes)
+
+    def _stop(self):
+        if self.proc is not None:
+            self.proc.kill()
+            self.proc.stdout.close()
+            self.proc.wait()
+            self.proc = None
+
+    def _read_into(self, buf):
+        view = memoryview(buf).cast("B")
+        got = 0
+        while got < len(view):
+            n = self.proc.stdout.readinto(view[got:])
+            if not n:
+                return False
+            got += n
+        return True
+
+    def seek(self, sec):
+        self._start(sec)
+
+    def set_period(self, period):
+        if period != self.period:
+            # the next frame on the old grid is where the new one starts
+            self._t0 += self._k * self.period
+            self._k = 0
+            self.period = period
+            self._stop()
+
+    def poll(self, poll=1, start_sec=0, end_sec=None):
+        self.set_period(poll)
+        return super().poll(poll, start_sec, end_sec)
+
+    def read_at(self, sec):
+        half_frame = 0.5 / self.fps if self.fps > 0 else 0
+        next_sec = self._t0 + self._k * self.period
+        if self.proc is None:
+            self._start(next_sec)
+        elif sec - next_sec > self.seek_threshold or sec < next_sec - self.period - half_frame:
+            self._start(sec)
+
+        while True:
+            fsec = self._t0 + self._k * self.period
+            buf = self._buffers[self._k % len(self._buffers)]
+            if not self._read_into(buf):
+                return None
+            self._k += 1
+            if fsec >= sec - half_frame:
+                return Frame(int(round(fsec * self.fps)), fsec, buf)
+
+    def close(self):
+        self._stop()
+
+
+BACKENDS = {
+    "opencv": OpenCVReader,
+    "pyav": PyAVReader,
+    "ffmpeg": FFmpegPipeReader,
+}
+
+def open_reader(video_path, backend="opencv", **opts):
+    """opens video_path with the named backend. opts are passed to the reader."""
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown video backend {backend!r}")
+    return BACKENDS[backend](video_path, **opts)
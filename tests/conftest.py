@@ -0,0 +1,71 @@
+"""shared fixtures: a synthetic clip with a match display on screen part of the time, and a fake OCR engine so
+pass1 can run without tesseract"""
+import os
+import numpy as np
+import cv2
+import pytest
+from matchinator import consts, matchers, ocr, util
+
+WIDTH, HEIGHT, FPS = 1280, 720, 10
+DURATION = 60
+# the match display is up for [DISPLAY_START, DISPLAY_END) seconds
+DISPLAY_START, DISPLAY_END = 10, 45
+PARAMS = consts.ScaledParams(WIDTH, HEIGHT)
+
+
+def bar(bit):
+    """columns of the timer crop holding bit"""
+    width = PARAMS.TIMER_WIDTH // 8
+    return slice(bit * width, (bit + 1) * width)
+
+
+def clip_frame(sec, logo):
+    """the clip's frame at sec. the timer crop holds the match clock as 8 black/white bars for FakeOCR"""
+    p = PARAMS
+    frame = np.full((HEIGHT, WIDTH, 3), 60, np.uint8)
+    cv2.putText(frame, "noise", (100, 100), 0, 2, (200, 200, 200), 3)
+    if DISPLAY_START <= sec < DISPLAY_END:
+        x, y = 50, 420
+        frame[y:y + logo.shape[0], x:x + logo.shape[1]] = logo
+        band_top = y + logo.shape[0]
+        frame[y:y + p.NAME_HEIGHT, x + p.NAME_LEFT_OFFSET:x + p.NAME_LEFT_OFFSET + p.NAME_WIDTH] = 100
+        timer_top = band_top + p.DISPLAY_HEIGHT - p.TIMER_EDGE_OFFSET - p.TIMER_HEIGHT
+        match_ts = 150 - int(sec - DISPLAY_START)
+        timer = frame[timer_top:timer_top + p.TIMER_HEIGHT, p.TIMER_LEFT_OFFSET:p.TIMER_LEFT_OFFSET + p.TIMER_WIDTH]
+        for bit in range(8):
+            timer[:, bar(bit)] = 255 * (match_ts >> bit & 1)
+    return frame
+
+
+class FakeOCR(ocr.OCRBackend):
+    """reads the clip's crops, told apart by their height"""
+    def read(self, img, psm=3):
+        if img.shape[0] == PARAMS.TIMER_HEIGHT:
+            return str(sum(1 << bit for bit in range(8) if img[:, bar(bit)].mean() > 128))
+        if img.shape[0] == PARAMS.NAME_HEIGHT:
+            return "Q1"
+        return "1234 5678"
+
+
+@pytest.fixture(scope="session")
+def clip_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("clip") / "clip.avi")
+    en = cv2.imread(os.path.join(os.path.dirname(matchers.__file__), matchers.EnergizeLogoMatcher.IMG_PATH))
+    logo = cv2.resize(en, (PARAMS.scalex(en.shape[1]), PARAMS.scaley(en.shape[0])))
+    # every MJPG frame is a keyframe, so seeking lands on the same pixels as reading through
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), FPS, (WIDTH, HEIGHT))
+    for i in range(DURATION * FPS):
+        writer.write(clip_frame(i / FPS, logo))
+    writer.release()
+    return path
+
+
+@pytest.fixture
+def fake_ocr(monkeypatch):
+    fake = FakeOCR()
+    monkeypatch.setattr(ocr, "backend", fake)
+    # batch_ocr's mosaic, read crop by crop
+    monkeypatch.setattr(ocr, "read_mosaic", lambda crops, psm=6: [fake.read(crop) for crop in crops])
+    monkeypatch.setattr(ocr, "cache", ocr.OCRCache())
+    # the clip's band is plain gray, which isn't a preview
+    monkeypatch.setattr(util, "match_is_preview", lambda match_display: False)
@@ -0,0 +1,36 @@
+"""Pass1Columns round trips"""
+import dataclasses
+import numpy as np
+from matchinator import columns, pass1
+
+
+def event_data():
+    matches = [
+        pass1.Pass1EventMatch("Q1", True, 0, 0.0, False, 29, ("1", "2"), ("3", "4"), None, False),
+        pass1.Pass1EventMatch("Q1", False, 30, 1.0, True, 12345678901, ("1", "2"), ("3", "4"), True, True, 1),
+        pass1.Pass1EventMatch("Q2", False, 60, 2.0, True, -5, ("5",), ("6",), False, False),
+        pass1.Pass1EventMatch("Q2", False, 90, 3.0, True, 10 ** 30, ("5",), ("6",), False, False),
+    ]
+    return pass1.Pass1EventData(30, 1920, 1080, matches)
+
+
+def test_round_trip(tmp_path):
+    edata = event_data()
+    cols = columns.Pass1Columns.from_event_data(edata)
+    cols.save(tmp_path / "cols")
+    loaded = columns.Pass1Columns.load(tmp_path / "cols")
+    expected = edata.matches[:3] + [dataclasses.replace(edata.matches[3], match_ts=columns.MATCH_TS_RANGE[1])]
+    assert list(loaded) == expected
+    assert loaded.to_event_data().matches == expected
+    assert list(loaded.replay_known) == [False, True, True, True]
+
+
+def test_concat_widens_old_rows():
+    cols = columns.Pass1Columns.from_event_data(event_data())[:3]
+    old_dtype = np.dtype([(name, np.int32 if name == "match_ts" else cols.rows.dtype[name])
+                          for name in cols.rows.dtype.names])
+    old = columns.Pass1Columns(cols.fps, cols.width, cols.height, cols.rows[:1].astype(old_dtype), cols.names, cols.teams)
+    joined = columns.Pass1Columns.concat([old, cols])
+    assert joined.rows.dtype == columns.ROW_DTYPE
+    assert list(joined) == list(cols)[:1] + list(cols)
+
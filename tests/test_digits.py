@@ -0,0 +1,41 @@
+"""DigitRecognizer on digits drawn with cv2.putText"""
+import numpy as np
+import cv2
+from matchinator import consts, digits, util
+
+
+def crop(text, rng):
+    """white on dark team/timer style crop, one line per line of text, with a little noise"""
+    lines = text.split("\n")
+    img = np.full((10 + 36 * len(lines), 30 + 22 * max(map(len, lines)), 3), 25, np.uint8)
+    for i, line in enumerate(lines):
+        cv2.putText(img, line, (8, 34 + 36 * i), cv2.FONT_HERSHEY_SIMPLEX, 1, (240, 240, 240), 2)
+    return np.clip(img.astype(int) + rng.integers(-10, 11, img.shape), 0, 255).astype(np.uint8)
+
+
+def test_train_read_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    labels = ["117", "2:30", "16072\n8492", "3456", "90"]
+    rec = digits.DigitRecognizer()
+    assert rec.train([crop(label, rng) for label in labels], labels) == len(labels)
+    assert sorted(rec.chars) == sorted(set("0123456789:"))
+
+    unseen = ["85", "1:07", "24601\n13579", "3"]
+    for text in unseen:
+        assert util.read_digits(crop(text, rng), rec) == text
+
+    rec.save(tmp_path / "digits.npz")
+    loaded = digits.DigitRecognizer.load(tmp_path / "digits.npz")
+    assert loaded.chars == rec.chars
+    for text in unseen:
+        img = crop(text, rng)
+        assert loaded.read(img) == rec.read(img)
+        assert rec.read(img)[1] >= consts.DIGIT_MIN_CONFIDENCE
+
+
+def test_mislabeled_crops_are_skipped():
+    rng = np.random.default_rng(1)
+    rec = digits.DigitRecognizer()
+    # label with a digit too few
+    assert rec.train([crop("123", rng), crop("45", rng)], ["12", "45"]) == 1
+    assert rec.chars == ["4", "5"]
@@ -0,0 +1,70 @@
+"""roinator layouts against the ScaledParams offsets they replace"""
+import numpy as np
+import pytest
+from matchinator import consts, layout, util
+
+
+def position(crop, frame):
+    """(row, col, height, width) of a crop (a view) in frame"""
+    offset = (crop.__array_interface__["data"][0] - frame.__array_interface__["data"][0]) // frame.strides[1]
+    return offset // frame.shape[1], offset % frame.shape[1], crop.shape[0], crop.shape[1]
+
+
+@pytest.mark.parametrize("size", [(1920, 1080), (1280, 720), (854, 480), (640, 360), (1440, 1080)])
+@pytest.mark.parametrize("is_top", [False, True])
+def test_default_layout_matches_offsets(size, is_top):
+    width, height = size
+    params = consts.ScaledParams(width, height)
+    frame = np.zeros((height, width, 3), np.uint8)
+    tl = (50, height // 2 - 80 if is_top else height // 2 + 40)
+    match_tlbr = (tl, (tl[0] + params.scalex(263), tl[1] + params.scaley(64)))
+    band, band_is_top = util.get_match_display(frame, match_tlbr, params)
+    assert band_is_top == is_top
+    left, right = util.crop_match_teams(band, params)
+    expected = {
+        "name": util.crop_match_name(frame, match_tlbr, params),
+        "timer": util.crop_match_time(band, is_top, params),
+        "left_teams": left,
+        "right_teams": right,
+    }
+
+    crops = layout.load_plan().crops(frame, match_tlbr, is_top)
+    assert set(crops) == set(expected)
+    for name, crop in crops.items():
+        # the layout is drawn on the 1918 pixel wide pp.png, so it rounds a little differently
+        diff = np.subtract(position(crop, frame), position(expected[name], frame))
+        assert np.abs(diff).max() <= 1, name
+
+
+def test_match_fields():
+    values = {"name": "Qualification 4", "timer": "25", "left_team2": "3415", "left_team1": "8405",
+              "right_teams": "3774 10785"}
+    assert layout.ExtractionPlan.match_fields(values) == ("Qualification 4", "25", ["8405", "3415"], ["3774", "10785"])
+
+
+def test_pp_reference():
+    # a layout roinator saved over pp.png, without band/logo keys
+    lay = layout.Layout([{"name": "timer", "x": 914, "y": 199, "w": 90, "h": 44}], (1918, 254))
+    assert lay.band == (0, 69, 1918, 180)
+    region = lay.compile()["timer"]
+    assert region.anchor == layout.BAND
+    assert region.y == pytest.approx(130 / 180)
+
+
+def test_rejects_whole_image_that_isnt_a_band():
+    with pytest.raises(ValueError):
+        layout.Layout([], (1920, 400))
+
+
+def test_region_outside_band_needs_logo():
+    rois = [{"name": "name", "x": 340, "y": 0, "w": 460, "h": 60}]
+    with pytest.raises(ValueError):
+        layout.Layout(rois, (1920, 260), band=(0, 80, 1920, 180)).compile()
+    region = layout.Layout(rois, (1920, 260), band=(0, 80, 1920, 180), logo=(0, 0)).compile()["name"]
+    assert region.anchor == layout.LOGO
+
+
+def test_missing_fields():
+    plan = layout.Layout([{"name": "timer", "x": 914, "y": 130, "w": 90, "h": 44}], (1920, 180)).compile()
+    with pytest.raises(ValueError):
+        plan.check_match_fields()
@@ -0,0 +1,127 @@
+"""matchers against the plain opencv code they replaced"""
+import os
+import numpy as np
+import cv2
+import pytest
+from matchinator import consts, matchers, util
+
+
+def reference_threshold(frame, hue, tolerance=5):
+    """BlobMatcher.threshold before HueClassifier"""
+    hue = matchers.BlobMatcher.colors.get(hue, hue)
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    thr = cv2.inRange(hsv, (max(hue - tolerance, 0), 0, 0), (min(hue + tolerance, 255), 255, 255))
+    if (hue - tolerance) < 0:
+        thr = cv2.bitwise_or(thr, cv2.inRange(hsv, ((256 + hue - tolerance) % 256, 0, 0), (255, 255, 255)))
+    if (hue + tolerance) > 255:
+        thr = cv2.bitwise_or(thr, cv2.inRange(hsv, (0, 0, 0), ((hue + tolerance) % 256, 255, 255)))
+    return thr
+
+
+def bands():
+    """random noise plus a preview-like red/blue band, a white band and a dark blue band"""
+    rng = np.random.default_rng(0)
+    out = [rng.integers(0, 256, (90, 640, 3), dtype=np.uint8) for _ in range(4)]
+    preview = np.zeros((90, 640, 3), np.uint8)
+    preview[:, :320] = (40, 40, 200)
+    preview[:, 320:] = (200, 120, 30)
+    out.append(preview)
+    out.append(np.full((90, 640, 3), 240, np.uint8))
+    out.append(np.full((90, 640, 3), (60, 35, 20), np.uint8))
+    return out
+
+
+@pytest.mark.parametrize("hue", ["red", "blue", "tan", 0, 3, 177])
+def test_threshold_matches_in_range(hue):
+    for band in bands():
+        assert np.array_equal(matchers.BlobMatcher.threshold(band, hue), reference_threshold(band, hue))
+
+
+def test_preview_and_flip_decisions_match():
+    params = consts.ScaledParams(640, 360)
+    for band in bands():
+        size = band.shape[0] * band.shape[1]
+        blobs = np.count_nonzero(reference_threshold(band, "blue")) + np.count_nonzero(reference_threshold(band, "red"))
+        assert util.match_is_preview(band) == (blobs / size >= consts.MATCH_PREVIEW_THR)
+
+        score = util.crop_rect(band, (params.LEFT_TOTAL_SCORE_OFFSET, params.LEFT_TOTAL_SCORE_WIDTH),
+                               (0, params.LEFT_TOTAL_SCORE_HEIGHT))
+        blue = np.count_nonzero(reference_threshold(score, "blue")) / (score.shape[0] * score.shape[1])
+        assert util.are_colors_flipped(band, params) == (blue < consts.MATCH_PREVIEW_THR)
+
+
+def test_wrap_and_gating():
+    gray = np.full((4, 4, 3), 128, np.uint8)
+    pure_red = np.zeros((4, 4, 3), np.uint8)
+    pure_red[..., 2] = 255
+    plain = matchers.HueClassifier(["red"])
+    wrapped = matchers.HueClassifier(["red"], wrap=True, min_sat=consts.HUE_MIN_SAT, min_val=consts.HUE_MIN_VAL)
+    # hue 0: only red once wrapped, and gray never with gating
+    assert plain.fractions(pure_red)["red"] == 0
+    assert wrapped.fractions(pure_red)["red"] == 1
+    assert wrapped.fractions(gray)["red"] == 0
+
+
+PARAMS = consts.ScaledParams(1280, 720)
+
+
+def background(rng):
+    """blurred noise, so no window is flat and nothing in it looks like a logo"""
+    noise = cv2.GaussianBlur(rng.integers(0, 256, (PARAMS.in_height, PARAMS.in_width)).astype(np.float32), (0, 0), 6)
+    return cv2.cvtColor(cv2.normalize(noise, None, 40, 200, cv2.NORM_MINMAX).astype(np.uint8), cv2.COLOR_GRAY2BGR)
+
+
+def scene(rng, *tls):
+    """a frame with the logo pasted at each top left in tls"""
+    frame = background(rng)
+    logo = cv2.cvtColor(matchers.EnergizeLogoMatcher(PARAMS).template, cv2.COLOR_GRAY2BGR)
+    for x, y in tls:
+        frame[y:y + logo.shape[0], x:x + logo.shape[1]] = logo
+    return frame
+
+
+def test_tracked_matches_full_search():
+    rng = np.random.default_rng(1)
+    # jitters in place, flips above the logo's row, goes away, comes back somewhere else
+    tls = [(50 + i % 3, 400 - i % 2) for i in range(12)] + [(51, 278)] * 3 + [None] * 3 + [(900, 100)] * 4
+    full = matchers.EnergizeLogoMatcher(PARAMS)
+    tracked = matchers.EnergizeLogoMatcher(PARAMS, track=True, revalidate=5)
+    for tl in tls:
+        frame = scene(rng, tl) if tl else background(rng)
+        assert tracked.match(frame) == full.match(frame), tl
+    assert tracked.search_stats["tracked"] > 0
+
+
+def test_pyramid_matches_full_search():
+    rng = np.random.default_rng(2)
+    full = matchers.EnergizeLogoMatcher(PARAMS)
+    pyramid = matchers.EnergizeLogoMatcher(PARAMS, pyramid=4)
+    assert pyramid.coarse_template is not None
+    for _ in range(10):
+        tl = (int(rng.integers(0, 1100)), int(rng.integers(0, 670)))
+        frame = scene(rng, tl)
+        assert pyramid.match(frame) == full.match(frame) == (True, (tl, (tl[0] + 175, tl[1] + 42)))
+    frame = background(rng)
+    assert pyramid.match(frame) == full.match(frame) == (False, None)
+
+    frame = scene(rng, (40, 80), (700, 500))
+    # both score 1, so only the order can differ
+    assert sorted(tlbr for _, tlbr in pyramid.match_all(frame)) == sorted(tlbr for _, tlbr in full.match_all(frame))
+    assert len(full.match_all(frame)) == 2
+
+
+def test_template_bank_correlate_matches_match_template():
+    paths = [matchers.EnergizeLogoMatcher.IMG_PATH, matchers.PPCapMatcher.IMG_PATH]
+    bank = matchers.TemplateBank.from_paths(PARAMS, [os.path.join(os.path.dirname(matchers.__file__), p) for p in paths],
+                                            pyramid=1)
+    rng = np.random.default_rng(3)
+    scaled = bank.scale_frame(scene(rng, (300, 200)))
+    for template, score in zip(bank.scaled_templates, bank.correlate(scaled)):
+        expected = cv2.matchTemplate(scaled, template, cv2.TM_CCOEFF_NORMED)
+        assert score.shape == expected.shape
+        np.testing.assert_allclose(score, expected, atol=1e-4)
+
+    # and the bank picks the logo where a TemplateMatcher finds it
+    frame = scene(rng, (640, 480))
+    assert bank.match(frame) == matchers.EnergizeLogoMatcher(PARAMS).match(frame)
+    assert bank.last_name == "en"
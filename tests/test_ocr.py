@@ -0,0 +1,53 @@
+"""OCR helpers that don't need tesseract"""
+import numpy as np
+import cv2
+from matchinator import ocr
+
+
+def test_mosaic_pads_with_background():
+    crop = np.full((20, 30, 3), (200, 180, 160), np.uint8)
+    # text touching the top and bottom rows
+    crop[:, 10:12] = 0
+    wide = np.full((10, 50, 3), 255, np.uint8)
+    image, spans = ocr.mosaic([crop, wide], sep=16)
+
+    assert image.shape == (20 + 10 + 4 * 16, 50, 3)
+    (top, bottom), (wide_top, wide_bottom) = spans
+    assert np.array_equal(image[top:bottom, :30], crop)
+    assert np.array_equal(image[wide_top:wide_bottom], wide)
+    # the separators and the right padding are the crop's background, with no streaks of its text
+    assert (image[:top] == (200, 180, 160)).all()
+    assert (image[bottom:bottom + 16] == (200, 180, 160)).all()
+    assert (image[top:bottom, 30:] == (200, 180, 160)).all()
+
+
+def text_crop(text, rng):
+    """team numbers on a dark band, with a little noise like compression leaves"""
+    img = np.full((40, 160, 3), 30, np.uint8)
+    cv2.putText(img, text, (5, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+    return np.clip(img.astype(int) + rng.integers(-8, 9, img.shape), 0, 255).astype(np.uint8)
+
+
+def test_change_detector_carries_until_the_crop_changes():
+    rng = np.random.default_rng(0)
+    changes = ocr.ChangeDetector(threshold=32)
+    reads = []
+
+    def read(text):
+        return lambda img: reads.append(text) or text
+
+    left, right = ("teams", 0, "left"), ("teams", 0, "right")
+    assert changes.get(left, text_crop("1234", rng), read("1234")) == "1234"
+    # the same numbers again, with different noise: carried forward
+    for _ in range(3):
+        assert changes.get(left, text_crop("1234", rng), read("wrong")) == "1234"
+    # another slot showing the same pixels is still read once
+    assert changes.get(right, text_crop("1234", rng), read("1234")) == "1234"
+    # one digit changes: read again, and the new value is carried from then on
+    assert changes.get(left, text_crop("1284", rng), read("1284")) == "1284"
+    assert changes.get(left, text_crop("1284", rng), read("wrong")) == "1284"
+    assert reads == ["1234", "1234", "1284"]
+    assert changes.stats() == {"teams": (4, 3)}
+
+    changes.enabled = False
+    assert changes.get(left, text_crop("1284", rng), read("off")) == "off"
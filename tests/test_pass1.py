@@ -0,0 +1,76 @@
+"""pass1 on the synthetic clip from conftest, with OCR faked"""
+import io
+import shutil
+import pytest
+from matchinator import index, layout, pass1, video
+
+
+class Crash(Exception):
+    pass
+
+
+def run(clip_path, **kwargs):
+    return pass1.run(clip_path, pout=io.StringIO(), **kwargs).matches
+
+
+def crash_at(monkeypatch, sec):
+    """makes the opencv reader blow up once asked for a frame at or past sec"""
+    read_at = video.OpenCVReader.read_at
+
+    def crashing_read_at(self, t):
+        if t >= sec:
+            raise Crash(t)
+        return read_at(self, t)
+    monkeypatch.setattr(video.OpenCVReader, "read_at", crashing_read_at)
+
+
+@pytest.mark.parametrize("opts", [
+    {},
+    {"browse_poll": 8},
+    {"batch_ocr": True, "ocr_batch_frames": 4},
+    {"ocr_workers": 2},
+])
+def test_resume_matches_uninterrupted(clip_path, fake_ocr, monkeypatch, tmp_path, opts):
+    expected = run(clip_path, **opts)
+    assert expected
+
+    journal = str(tmp_path / "journal.jsonl")
+    with monkeypatch.context() as m:
+        crash_at(m, 33)
+        with pytest.raises(Crash):
+            run(clip_path, journal=journal, checkpoint_every=5, **opts)
+    _, sec, done = pass1.Pass1Journal.load(journal)[:3]
+    assert sec is not None and not done
+
+    resumed = run(clip_path, journal=journal, checkpoint_every=5, resume=True, **opts)
+    assert resumed == expected
+
+
+@pytest.mark.parametrize("opts", [{}, {"browse_poll": 8}])
+def test_parallel_matches_serial(clip_path, fake_ocr, opts):
+    expected = run(clip_path, **opts)
+    result = pass1.run_parallel(clip_path, threads=2, segments=5, pout=io.StringIO(), **opts).matches
+    assert result == expected
+
+
+def test_index_spans_end_in_display(clip_path, fake_ocr):
+    # a span ending while the display is still up
+    result = run(clip_path, browse_poll=8, index=index.DisplayIndex([(0, 16)], 60))
+    assert [m.video_sec for m in result] == list(range(10, 16))
+
+
+@pytest.mark.parametrize("opts", [{}, {"layout": layout.DEFAULT_LAYOUT}])
+def test_carried_fields_match_rereads(clip_path, fake_ocr, opts):
+    assert run(clip_path, skip_unchanged=True, **opts) == run(clip_path, skip_unchanged=False, **opts)
+
+
+def test_default_layout_matches_offsets(clip_path, fake_ocr):
+    assert run(clip_path, layout=layout.DEFAULT_LAYOUT) == run(clip_path)
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None, reason="needs ffmpeg")
+@pytest.mark.parametrize("opts", [{"poll": 0.5}, {"poll": 0.5, "browse_poll": 8}])
+def test_ffmpeg_samples_every_poll(clip_path, fake_ocr, opts):
+    expected = [m.frame_idx for m in run(clip_path, **opts)]
+    assert expected[:3] == [100, 105, 110]
+    assert [m.frame_idx for m in run(clip_path, backend="ffmpeg", **opts)] == expected
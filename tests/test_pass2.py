@@ -0,0 +1,119 @@
+"""checks the vectorized and online pass2 against the original list-based combine_matches"""
+import random
+import dataclasses
+import pytest
+from matchinator import consts, pass1, pass2
+
+
+def reference_display(matches, display_id=0):
+    """the list-based combine_display pass2 had before it was vectorized"""
+    groups = pass2.coalese_groups(pass2.filter_groups(pass2.coalese_groups(matches)))
+    all_matches = []
+    for match_group in groups:
+        p2em = pass2.Pass2EventMatch(None, None, None, None, None, None, None, None)
+        p2em.name = match_group[0].name
+        p2em.red_teams = pass2.freq_max(match_group, "red_teams")
+        p2em.blue_teams = pass2.freq_max(match_group, "blue_teams")
+        p2em.is_replay = pass2.freq_max(match_group, "is_replay")
+        p2em.colors_flipped = pass2.freq_max(match_group, "colors_flipped")
+        p2em.top = pass2.freq_max(match_group, "top")
+        p2em.display_id = display_id
+
+        auto_max_time, auto_max_ts = None, None
+        for auto_match in (c for c in match_group if not c.is_tele):
+            if auto_match.match_ts >= 30:
+                continue
+            if auto_max_time is None or auto_match.match_ts > auto_max_time:
+                auto_max_time, auto_max_ts = auto_match.match_ts, auto_match.video_sec
+        if auto_max_time is not None and auto_max_time <= 8:
+            auto_max_time = None
+
+        tele_max_time, tele_max_ts = None, None
+        tele_min_time, tele_min_ts = None, None
+        for tele_match in (c for c in match_group if c.is_tele):
+            if tele_match.match_ts == 0:
+                continue
+            if tele_max_time is None or tele_match.match_ts > tele_max_time:
+                tele_max_time, tele_max_ts = tele_match.match_ts, tele_match.video_sec
+            if tele_min_time is None or tele_min_time >= tele_match.match_ts:
+                tele_min_time, tele_min_ts = tele_match.match_ts, tele_match.video_sec
+
+        if auto_max_time is not None:
+            match_start = max(auto_max_ts - (30 - auto_max_time) - consts.MATCH_PRE_AUTO_START, 0)
+        elif tele_max_time is None:
+            raise RuntimeError("no timers")
+        else:
+            match_start = max(tele_max_ts - (120 - tele_max_time) - (38) - consts.MATCH_PRE_AUTO_START, 0)
+        if tele_min_time is not None:
+            match_end = tele_min_ts + tele_min_time + consts.MATCH_POST_TELE_END
+        else:
+            match_end = auto_max_ts + auto_max_time + 128 + consts.MATCH_POST_TELE_END
+        p2em.start_ts, p2em.end_ts = match_start, match_end
+        all_matches.append(p2em)
+    return all_matches
+
+
+def reference(edata):
+    displays = pass2.split_displays(edata.matches)
+    all_matches = []
+    for display_id, matches in displays.items():
+        all_matches.extend(reference_display(matches, display_id))
+    if len(displays) > 1:
+        all_matches.sort(key=lambda m: m.start_ts)
+    return all_matches
+
+
+def random_stream(seed, n, displays=1):
+    rng = random.Random(seed)
+    teams = [("1", "2"), ("3", "4"), ("5", "6")]
+    matches, name, sec = [], "Q1", 0.0
+    for i in range(n):
+        if rng.random() < 0.05:
+            name = f"Q{rng.randint(1, 6)}"
+        sec += rng.choice([0.5, 1.0, 1 / 3, 40])
+        ts = rng.choice([0, 1, 5, 8, 9, 20, 29, 30, 60, 100, 120, 40000, 12345678901]) if rng.random() < 0.8 else rng.randint(0, 130)
+        matches.append(pass1.Pass1EventMatch(
+            name, rng.random() < 0.5, i, sec, rng.random() < 0.6, ts, rng.choice(teams), rng.choice(teams),
+            rng.choice([None, None, False, True]), rng.random() < 0.5, rng.randrange(displays)))
+    return pass1.Pass1EventData(30, 1920, 1080, matches)
+
+
+def outcome(combine, edata):
+    """the combined matches with the types of their values, or the exception raised"""
+    try:
+        return [tuple((type(v), v) for v in dataclasses.astuple(m)) for m in combine(edata)]
+    except (RuntimeError, IndexError) as e:
+        return type(e)
+
+
+def online(edata):
+    updates = {}
+    for upd in pass2.combine_stream(edata.matches, close_sec=20):
+        assert upd.revised == (upd.key in updates)
+        updates[upd.key] = upd.match
+    # keys are handed out in group order
+    return [updates[key] for key in sorted(updates)]
+
+
+@pytest.mark.parametrize("displays", [1, 3])
+def test_matches_reference(displays):
+    compared = 0
+    for seed in range(500):
+        edata = random_stream(seed, random.Random(seed).randint(0, 150), displays)
+        expected = outcome(reference, edata)
+        if expected is IndexError:
+            # a display with every entry filtered out, which the reference can't handle
+            continue
+        assert outcome(pass2.combine_matches, edata) == expected, seed
+        if expected is not RuntimeError and displays == 1:
+            assert outcome(online, edata) == expected, seed
+        compared += 1
+    assert compared > 300
+
+
+def test_unknown_replay_stays_none():
+    matches = [pass1.Pass1EventMatch("Q1", True, i, float(i), True, 100 - i, ("1",), ("2",), None, False)
+               for i in range(10)]
+    edata = pass1.Pass1EventData(30, 1920, 1080, matches)
+    assert pass2.combine_matches(edata)[0].is_replay is None
+    assert online(edata)[0].is_replay is None
@@ -0,0 +1,73 @@
+"""PollScheduler driven by a made up timeline instead of a video"""
+import random
+import pytest
+from matchinator import consts, schedule
+
+
+def drive(sched, displays):
+    """runs sched over displays, a list of [start, end) seconds a match display is up. returns the times sampled"""
+    sampled = []
+    while (t := sched.next_time()) is not None:
+        sampled.append(t)
+        sched.update(t, t, any(start <= t < end for start, end in displays))
+        assert len(sampled) < 10000
+    return sampled
+
+
+def missed(sampled, displays, start_sec, end_sec, poll=1):
+    """dense grid times inside a display that were never sampled"""
+    seen = set(round(t, 6) for t in sampled)
+    grid = (start_sec + poll * i for i in range(int((end_sec - start_sec) / poll) + 1))
+    return [t for t in grid if t < end_sec and any(s <= t < e for s, e in displays) and round(t, 6) not in seen]
+
+
+def test_dense_polling():
+    assert drive(schedule.PollScheduler(1, start_sec=0, end_sec=5), []) == [0, 1, 2, 3, 4]
+
+
+def test_browse_backs_off():
+    sampled = drive(schedule.PollScheduler(1, browse_poll=8, start_sec=0, end_sec=40), [])
+    assert sampled[:4] == [0, 8, 16, 24]
+    assert len(sampled) < 10
+
+
+def test_browse_backfills_display():
+    displays = [(10, 30)]
+    sampled = drive(schedule.PollScheduler(1, browse_poll=8, start_sec=0, end_sec=60), displays)
+    assert not missed(sampled, displays, 0, 60)
+    # samples come out in backfill order, but every one only once
+    assert len(sampled) == len(set(sampled))
+
+
+def test_display_right_before_end():
+    # browse samples 0 and 8, the next step (16) is past the end: 15 is sampled instead, and 9-14 backfilled
+    displays = [(10, 45)]
+    sched = schedule.PollScheduler(1, browse_poll=8, start_sec=0, end_sec=16)
+    sampled = drive(sched, displays)
+    assert not missed(sampled, displays, 0, 16)
+    assert max(sampled) == 15
+    assert sched.settled == 16
+
+
+def test_nothing_past_end():
+    sampled = drive(schedule.PollScheduler(1, browse_poll=8, start_sec=3, end_sec=16), [])
+    assert min(sampled) == 3 and max(sampled) == 15
+
+
+@pytest.mark.parametrize("poll", [1, 0.5])
+def test_no_display_missed(poll):
+    rng = random.Random(0)
+    for _ in range(200):
+        start_sec = rng.randrange(0, 40) * poll
+        end_sec = start_sec + rng.randrange(1, 200) * poll
+        displays = []
+        t = rng.uniform(0, 20)
+        while t < end_sec + 20:
+            length = rng.uniform(consts.MATCH_MIN_DISPLAY_SEC, 60)
+            displays.append((t, t + length))
+            t += length + rng.uniform(1, 60)
+        sched = schedule.PollScheduler(poll, browse_poll=consts.MATCH_MIN_DISPLAY_SEC, start_sec=start_sec,
+                                       end_sec=end_sec)
+        sampled = drive(sched, displays)
+        assert all(start_sec <= t < end_sec for t in sampled)
+        assert not missed(sampled, displays, start_sec, end_sec, poll)